@@ -0,0 +1,264 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import base64
+import json
+from datetime import date, datetime, timedelta
+
+from flask import Blueprint, Response, abort, current_app, request, \
+    stream_with_context
+
+from models import db, Venue, Artist, Show
+
+try:
+    # optional, several times faster than json and encodes datetimes natively
+    import orjson
+except ImportError:
+    orjson = None
+
+api = Blueprint('api', __name__, url_prefix='/api/v1')
+
+#----------------------------------------------------------------------------#
+# Serialization.
+#----------------------------------------------------------------------------#
+
+
+def _default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(repr(value) + ' is not JSON serializable')
+
+
+def dumps(value):
+    # bytes, so streamed lines skip an extra encode
+    if orjson is not None:
+        return orjson.dumps(value, default=_default)
+    return json.dumps(value, default=_default, separators=(',', ':')).encode()
+
+
+def json_response(value, status=200):
+    return Response(dumps(value), status=status, mimetype='application/json')
+
+
+# fields clients may request with ?fields=, mapped to the selected column
+VENUE_FIELDS = {
+    name: getattr(Venue, name) for name in (
+        'id', 'name', 'city', 'state', 'address', 'latitude', 'longitude',
+        'phone', 'image_link', 'facebook_link', 'genres', 'website',
+        'seeking_talent', 'seeking_description', 'updated_at')
+}
+
+ARTIST_FIELDS = {
+    name: getattr(Artist, name) for name in (
+        'id', 'name', 'city', 'state', 'phone', 'genres', 'image_link',
+        'facebook_link', 'website', 'seeking_venue', 'seeking_description',
+        'updated_at')
+}
+
+SHOW_FIELDS = {
+    'id': Show.id,
+    'start_time': Show.start_time,
+    'duration': Show.duration,
+    'end_time': Show.end_time,
+    'venue_id': Show.venue_id,
+    'venue_name': Venue.name,
+    'venue_image_link': Venue.image_link,
+    'artist_id': Show.artist_id,
+    'artist_name': Artist.name,
+    'artist_image_link': Artist.image_link,
+    'updated_at': Show.updated_at,
+}
+
+
+def requested_fields(available):
+    # sparse fieldsets: ?fields=id,name selects only those columns
+    fields = request.args.get('fields')
+    if not fields:
+        return list(available)
+    fields = [field.strip() for field in fields.split(',') if field.strip()]
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        abort(json_response(
+            {'error': 'unknown fields: ' + ', '.join(unknown)}, 400))
+    return fields
+
+
+#----------------------------------------------------------------------------#
+# Pagination.
+#----------------------------------------------------------------------------#
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(dumps(values)).decode('ascii')
+
+
+def decode_cursor(cursor, keys):
+    try:
+        after = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if not isinstance(after, list) or len(after) != len(keys):
+            raise ValueError(cursor)
+        if 'start_time' in keys:
+            index = keys.index('start_time')
+            after[index] = datetime.fromisoformat(after[index])
+        return after
+    except (ValueError, TypeError):
+        abort(json_response({'error': 'invalid cursor'}, 400))
+
+
+def collection(query, fields, columns, keys):
+    # keys are the columns the collection is ordered by; the cursor carries
+    # the last row's values for them. With ?format=ndjson (or an
+    # application/x-ndjson Accept header) every row is streamed instead,
+    # in batches, so memory stays flat however many rows match
+    selected = fields + [key for key in keys if key not in fields]
+    query = query.with_entities(*[columns[field] for field in selected])
+    query = query.order_by(*[columns[key] for key in keys])
+
+    if request.args.get('format') == 'ndjson' or \
+            request.accept_mimetypes.best == 'application/x-ndjson':
+        def generate():
+            for row in query.yield_per(current_app.config['API_STREAM_BATCH']):
+                yield dumps(dict(zip(fields, row))) + b'\n'
+        return Response(
+            stream_with_context(generate()),
+            mimetype='application/x-ndjson')
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        after = decode_cursor(cursor, keys)
+        query = query.filter(
+            db.tuple_(*[columns[key] for key in keys]) > tuple(after))
+
+    limit = request.args.get(
+        'limit', current_app.config['API_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, current_app.config['API_MAX_PAGE_SIZE']))
+    rows = query.limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = dict(zip(selected, rows[-1]))
+        next_cursor = encode_cursor([last[key] for key in keys])
+
+    return json_response({
+        'data': [dict(zip(fields, row)) for row in rows],
+        'next_cursor': next_cursor,
+    })
+
+
+#----------------------------------------------------------------------------#
+# Endpoints.
+#----------------------------------------------------------------------------#
+
+@api.route('/venues')
+def venues():
+    return collection(
+        Venue.query, requested_fields(VENUE_FIELDS), VENUE_FIELDS, ['id'])
+
+
+@api.route('/artists')
+def artists():
+    return collection(
+        Artist.query, requested_fields(ARTIST_FIELDS), ARTIST_FIELDS, ['id'])
+
+
+@api.route('/shows')
+def shows():
+    # a show without a start time has no place in the start_time order,
+    # and its [null, id] cursor could not be decoded
+    query = db.session.query(Show).join(
+        Venue, Show.venue_id == Venue.id).join(
+        Artist, Show.artist_id == Artist.id).filter(
+        Show.start_time.isnot(None))
+    return collection(
+        query, requested_fields(SHOW_FIELDS), SHOW_FIELDS,
+        ['start_time', 'id'])
+
+
+def split_shows(shows, serialize):
+    now = datetime.now()
+    past_shows = []
+    upcoming_shows = []
+    # a show without a start time is neither past nor upcoming
+    for show in sorted(
+            (show for show in shows if show.start_time is not None),
+            key=lambda show: show.start_time):
+        if show.start_time < now:
+            past_shows.append(serialize(show))
+        else:
+            upcoming_shows.append(serialize(show))
+    return past_shows, upcoming_shows
+
+
+@api.route('/venues/<int:venue_id>')
+def venue(venue_id):
+    venue = Venue.query.options(
+        db.joinedload(Venue.show).joinedload(Show.artist)).filter(
+        Venue.id == venue_id).first()
+    if venue is None:
+        abort(json_response({'error': 'not found'}, 404))
+
+    data = venue.venue_to_dictionary()
+    data['past_shows'], data['upcoming_shows'] = split_shows(
+        venue.show, Show.show_artist)
+    return json_response(data)
+
+
+@api.route('/artists/<int:artist_id>')
+def artist(artist_id):
+    artist = Artist.query.options(
+        db.joinedload(Artist.show).joinedload(Show.venue)).filter(
+        Artist.id == artist_id).first()
+    if artist is None:
+        abort(json_response({'error': 'not found'}, 404))
+
+    data = artist.artist_to_dictionary()
+    data['past_shows'], data['upcoming_shows'] = split_shows(
+        artist.show, Show.show_venue)
+    return json_response(data)
+
+
+def parse_time(name, default):
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        abort(json_response({'error': 'invalid ' + name}, 400))
+
+
+@api.route('/venues/<int:venue_id>/free-slots')
+def venue_free_slots(venue_id):
+    # gaps of at least ?min_minutes= between the venue's shows in
+    # [?start=, ?end=), by default the next FREE_SLOT_DAYS days. Only the
+    # shows overlapping the window are read, through the GiST index of the
+    # show_venue_id_during_excl constraint. That index is partial, and
+    # tsrange() is not strict, so the IS NOT NULL has to be spelled out
+    # for the planner to use it
+    if db.session.query(Venue.id).filter(Venue.id == venue_id).scalar() is None:
+        abort(json_response({'error': 'not found'}, 404))
+
+    start = parse_time('start', datetime.now().replace(second=0, microsecond=0))
+    end = parse_time(
+        'end', start + timedelta(days=current_app.config['FREE_SLOT_DAYS']))
+    if end <= start:
+        abort(json_response({'error': 'end must be after start'}, 400))
+    length = timedelta(minutes=request.args.get(
+        'min_minutes', current_app.config['FREE_SLOT_MIN_MINUTES'], type=int))
+
+    booked = db.session.query(Show.start_time, Show.end_time).filter(
+        Show.venue_id == venue_id,
+        Show.start_time.isnot(None),
+        Show.during().op('&&')(db.func.tsrange(start, end))
+    ).order_by(Show.start_time)
+
+    slots = []
+    free_from = start
+    for show in booked:
+        if show.start_time - free_from >= length:
+            slots.append({'start': free_from, 'end': show.start_time})
+        free_from = max(free_from, show.end_time)
+    if end - free_from >= length:
+        slots.append({'start': free_from, 'end': end})
+    return json_response({'data': slots})
@@ -2,175 +2,505 @@
 # Imports
 #----------------------------------------------------------------------------#
 
-import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
-from flask_moment import Moment
-from flask_sqlalchemy import SQLAlchemy
 import logging
+import os
+from datetime import datetime
+from functools import lru_cache
+from itertools import groupby
 from logging import Formatter, FileHandler
-from flask_wtf import Form
-from forms import *
-from flask_migrate import Migrate
-#import datetime
-from sqlalchemy import ARRAY, String
-import sys
+
+import click
+from flask import Blueprint, Flask, Response, render_template, request, flash, redirect, url_for, abort, jsonify, current_app
+from flask_moment import Moment
+from jinja2 import FileSystemBytecodeCache
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from api import api
+from cache import FragmentCacheExtension, MemoryCache, PageCache, conditional, page_key
+from cli import fyyur_cli
+from forms import ArtistForm, ShowForm, VenueForm, canonical_genre, normalize_genres
+from geocode import geocoding
+from models import db, Venue, Artist, Show, VenueStats
+from nearby import venue_locations
+from jobs import jobs
+from metrics import Metrics
+from replicas import replicas
+from stats import refresh_show_stats
+from suggest import suggestions
 
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-db = SQLAlchemy(app)
-
-migrate = Migrate(app, db)
+# extensions are created unbound and attached to each app in create_app
+moment = Moment()
+page_cache = PageCache()
+metrics = Metrics()
+
+main = Blueprint('main', __name__)
+
+
+def create_app(config='config'):
+    # application factory, e.g. "gunicorn 'app:create_app()'". Nothing here
+    # talks to the database: engines connect on the first query
+    app = Flask(__name__)
+    app.config.from_object(config)
+    configure_templates(app)
+
+    db.init_app(app)
+    replicas.init_app(app)
+    moment.init_app(app)
+    page_cache.init_app(app)
+    jobs.init_app(app)
+    suggestions.init_app(app)
+    geocoding.init_app(app)
+    venue_locations.init_app(app)
+    if app.config['METRICS_ENABLED']:
+        metrics.init_app(app)
+
+    # alembic is only needed by the 'flask db' commands; importing it costs
+    # more than the rest of the app, so web workers skip it
+    if click.get_current_context(silent=True) is not None:
+        from flask_migrate import Migrate
+        Migrate(app, db)
+
+    app.register_blueprint(main)
+    app.register_blueprint(api)
+    app.cli.add_command(fyyur_cli)
+
+    if app.config['DB_PGBOUNCER']:
+        with app.app_context():
+            for bind in [None] + replicas.binds:
+                set_statement_timeout_per_transaction(
+                    db.get_engine(app, bind=bind),
+                    app.config['DB_STATEMENT_TIMEOUT_MS'])
+
+    if not app.debug:
+        file_handler = FileHandler('error.log')
+        file_handler.setFormatter(Formatter(
+            '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'))
+        app.logger.setLevel(logging.INFO)
+        file_handler.setLevel(logging.INFO)
+        app.logger.addHandler(file_handler)
+        app.logger.info('errors')
+
+    return app
+
+
+def configure_templates(app):
+    # must run before anything touches app.jinja_env, which is built from
+    # jinja_options on first access
+    options = dict(app.jinja_options)
+    options['extensions'] = list(options.get('extensions', ())) + [
+        FragmentCacheExtension]
+    cache_dir = app.config['JINJA_BYTECODE_CACHE_DIR']
+    if cache_dir:
+        # compiled templates survive restarts, so new workers skip parsing
+        os.makedirs(cache_dir, exist_ok=True)
+        options['bytecode_cache'] = FileSystemBytecodeCache(cache_dir)
+    app.jinja_options = options
+
+    app.jinja_env.fragment_cache = MemoryCache(
+        app.config['FRAGMENT_CACHE_MAX_ENTRIES'])
+    app.jinja_env.fragment_cache_timeout = app.config['FRAGMENT_CACHE_TIMEOUT']
+
+
+@main.teardown_app_request
+def shutdown_session(exception=None):
+    # the one place a request's session is released: rolls back anything
+    # left uncommitted and returns the connection to the pool
+    db.session.remove()
+
+
+def set_statement_timeout_per_transaction(engine, timeout_ms):
+    # PgBouncer in transaction mode rejects the 'options' startup parameter
+    # and would leak a session-level SET to other clients, so the timeout
+    # is applied per transaction instead
+    @event.listens_for(engine, 'begin')
+    def set_statement_timeout(connection):
+        cursor = connection.connection.cursor()
+        cursor.execute('SET LOCAL statement_timeout = %s', (timeout_ms,))
+        cursor.close()
 
 # TODO: connect to a local postgresql database - DONE
 
 #----------------------------------------------------------------------------#
-# Models.
+# Filters.
 #----------------------------------------------------------------------------#
 
-
-class Venue(db.Model):
-    __tablename__ = 'venue'
-
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
-    city = db.Column(db.String(120))
-    state = db.Column(db.String(120))
-    address = db.Column(db.String(120))
-    phone = db.Column(db.String(120))
-    image_link = db.Column(db.String(500))
-    facebook_link = db.Column(db.String(120))
-    #added - DONE
-    genres = db.Column(db.ARRAY(db.String))
-    website = db.Column(db.String(120))
-    seeking_talent = db.Column(db.Boolean)
-    seeking_description = db.Column(db.String(500))
-    show = db.relationship("Show", back_populates="venue")
-
-    # TODO: implement any missing fields, as a database migration using
-    # Flask-Migrate - DONE
-    def venue_to_dictionary(self):
-        return{
-            'id': self.id,
-            'name': self.name,
-            'city': self.city,
-            'state': self.state,
-            'address': self.address,
-            'phone': self.phone,
-            'image_link': self.image_link,
-            'facebook_link': self.facebook_link,
-            'genres': self.genres,
-            'website': self.website,
-            'seeking_talent': self.seeking_talent,
-            'seeking_description': self.seeking_description
-        }
-
-
-class Artist(db.Model):
-    __tablename__ = 'artist'
-
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
-    city = db.Column(db.String(120))
-    state = db.Column(db.String(120))
-    phone = db.Column(db.String(120))
-    genres = db.Column(db.ARRAY(db.String))
-    image_link = db.Column(db.String(500))
-    facebook_link = db.Column(db.String(120))
-    #added - DONE
-    website = db.Column(db.String(120))
-    seeking_venue = db.Column(db.Boolean)
-    seeking_description = db.Column(db.String(500))
-    show = db.relationship('Show', back_populates="artist")
-
-    # TODO: implement any missing fields, as a database migration using
-    # Flask-Migrate - DONE
-    def artist_to_dictionary(self):
-        return{
-            'id': self.id,
-            'name': self.name,
-            'city': self.city,
-            'state': self.state,
-            'phone': self.phone,
-            'genres': self.genres,
-            'image_link': self.image_link,
-            'facebook_link': self.facebook_link,
-            'website': self.website,
-            'seeking_venue': self.seeking_venue,
-            'seeking_description': self.seeking_description
-        }
-
-# TODO Implement Show and Artist models, and complete all model
-# relationships and properties, as a database migration. - DONE
-
-
-class Show(db.Model):
-    __tablename__ = 'show'
-
-    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
-    start_time = db.Column(db.DateTime)
-    # table linked to venue via db.relationship
-    venue_id = db.Column(
-        db.Integer,
-        db.ForeignKey('venue.id'),
-        primary_key=True)
-    # table linked to artist via db.relationship
-    artist_id = db.Column(
-        db.Integer,
-        db.ForeignKey('artist.id'),
-        primary_key=True)
-    venue = db.relationship("Venue", back_populates="show")
-    artist = db.relationship("Artist", back_populates="show")
-
-    def show_artist(self):
-        return {
-            'artist_id': self.artist_id,
-            'artist_name': self.artist.name,
-            'artist_image_link': self.artist.image_link,
-            'start_time': self.start_time
-        }
-
-    def show_venue(self):
-        return {
-            'venue_id': self.venue_id,
-            'venue_name': self.venue.name,
-            'venue_image_link': self.venue.image_link,
-            'start_time': self.start_time
-        }
-
-
-# used a db.create all because the migration fuction wasn't recognising
-# the autoincrement=True change on the shows db
-db.create_all()
+# the two patterns the templates ask for by name
+DATETIME_FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=None)
+def datetime_pattern(format, locale):
+    # compiling the pattern and loading the locale's data only depend on
+    # the format and locale, so each pair is done once per process.
+    # Imported on first use, babel is only needed once a page renders
+    import babel.dates
+    from babel import Locale
+    pattern = babel.dates.parse_pattern(DATETIME_FORMATS.get(format, format))
+    return pattern, Locale.parse(locale or babel.dates.LC_TIME)
+
+
+@main.app_template_filter('datetime')
+def format_datetime(value, format='medium', locale=None):
+    if isinstance(value, str):
+        # views pass datetimes; strings are still accepted
+        import dateutil.parser
+        value = dateutil.parser.parse(value)
+    if format in ('long', 'short'):
+        # babel's own locale-dependent formats, not patterns
+        import babel.dates
+        return babel.dates.format_datetime(value, format, locale=locale or babel.dates.LC_TIME)
+    pattern, locale = datetime_pattern(format, locale)
+    return pattern.apply(value, locale)
 
 
 #----------------------------------------------------------------------------#
-# Filters.
+# Helpers.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format = "EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format = "EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
+def search_statement(model, search_term):
+    # ranked search over Venue or Artist, selecting only id and name.
+    # 'trigram' mode keeps the case-insensitive partial match on name
+    # (served by the pg_trgm indexes), 'fulltext' matches words in name,
+    # city, state and genres against the tsvector index
+    columns = db.select(model.id, model.name)
+
+    if current_app.config['SEARCH_MODE'] == 'fulltext':
+        document = db.func.fyyur_search_document(
+            model.name, model.city, model.state, model.genres)
+        terms = db.func.plainto_tsquery('simple', search_term)
+        statement = columns.where(document.op('@@')(terms)).order_by(
+            db.func.ts_rank(document, terms).desc(), model.name)
+    else:
+        pattern = '%{}%'.format(search_term.replace('\\', '\\\\').replace(
+            '%', '\\%').replace('_', '\\_'))
+        statement = columns.where(model.name.ilike(pattern, escape='\\')).order_by(
+            db.func.similarity(model.name, search_term).desc(), model.name)
+
+    return statement.limit(current_app.config['SEARCH_RESULT_LIMIT'])
+
+
+def search_results(rows):
+    rows = [{'id': row.id, 'name': row.name} for row in rows]
+    return {'count': len(rows), 'data': rows}
+
+
+def search_by_name(model, search_term):
+    return search_results(
+        db.session.execute(search_statement(model, search_term)))
+
+
+def venues_statement():
+    # every venue with its materialized count of upcoming shows (no row
+    # yet: none), ordered so venues in the same city/state sit next to
+    # each other
+    return db.select(
+        Venue.id,
+        Venue.name,
+        Venue.city,
+        Venue.state,
+        Venue.updated_at,
+        db.func.coalesce(
+            VenueStats.upcoming_shows_count, 0).label('num_upcoming_shows')
+    ).outerjoin(VenueStats, VenueStats.venue_id == Venue.id).order_by(
+        Venue.state, Venue.city, Venue.name)
+
+
+def venue_areas(venues):
+    return [{
+        "city": city,
+        "state": state,
+        "venues": [{
+            "id": venue.id,
+            "name": venue.name,
+            "updated_at": venue.updated_at,
+            "num_upcoming_shows": venue.num_upcoming_shows,
+        } for venue in area_venues]
+    } for (city, state), area_venues in groupby(
+        venues, key=lambda venue: (venue.city, venue.state))]
+
+
+def artists_statement():
+    return db.select(Artist.id, Artist.name).order_by(Artist.city)
+
+
+def listing_filters():
+    # ?genre=&city= on /venues and /artists, either left empty meaning no
+    # filter. The genre may be in any case, one outside the vocabulary is
+    # a 400
+    genre = request.args.get('genre') or None
+    if genre is not None:
+        genre = canonical_genre(genre)
+        if genre is None:
+            abort(400)
+    return genre, request.args.get('city') or None
+
+
+def filtered_statement(statement, model, order_by, genre, city):
+    # one page of the listing statement narrowed to the genre and/or city,
+    # resolved by the GIN index on genres and the index on city. Keyset
+    # pagination like /shows: ?after=<id> continues after that row
+    page_size = current_app.config['FILTER_PAGE_SIZE']
+    if genre is not None:
+        statement = statement.where(model.genres.contains([genre]))
+    if city is not None:
+        statement = statement.where(model.city == city)
+
+    after = request.args.get('after', type=int)
+    if after is not None:
+        last = db.session.execute(
+            db.select(*order_by).where(model.id == after)).first()
+        if last is None:
+            abort(400)
+        statement = statement.where(db.tuple_(*order_by) > tuple(last))
+
+    return statement.order_by(None).order_by(*order_by).limit(page_size + 1)
+
+
+def filtered_page(rows, genre, city):
+    # the rows to show and the link to the next page, if any
+    page_size = current_app.config['FILTER_PAGE_SIZE']
+    next_page = None
+    if len(rows) > page_size:
+        next_page = url_for(
+            request.endpoint, genre=genre, city=city,
+            after=rows[page_size - 1].id)
+    return rows[:page_size], next_page
+
+
+def shows_statement():
+    # one page of shows with only the columns the template needs, venue
+    # and artist joined in. Keyset pagination: ?after_time=&after_id=
+    # continue after the last (start_time, id) seen, so every page costs
+    # the same however deep the user scrolls
+    page_size = current_app.config['SHOWS_PER_PAGE']
+    statement = db.select(
+        Show.id,
+        Show.start_time,
+        Show.venue_id,
+        Venue.name.label('venue_name'),
+        Show.artist_id,
+        Artist.name.label('artist_name'),
+        Artist.image_link.label('artist_image_link'),
+        Show.updated_at,
+        Venue.updated_at.label('venue_updated_at'),
+        Artist.updated_at.label('artist_updated_at')
+    ).join(Venue, Show.venue_id == Venue.id).join(
+        Artist, Show.artist_id == Artist.id).where(
+        # unscheduled shows have no place in the timeline
+        Show.start_time.isnot(None))
+
+    after_time = request.args.get('after_time')
+    after_id = request.args.get('after_id', type=int)
+    if after_time is not None or after_id is not None:
+        try:
+            after_time = datetime.fromisoformat(after_time)
+        except (TypeError, ValueError):
+            abort(400)
+        if after_id is None:
+            abort(400)
+        statement = statement.where(
+            db.tuple_(Show.start_time, Show.id) > (after_time, after_id))
+
+    return statement.order_by(Show.start_time, Show.id).limit(page_size + 1)
+
+
+def show_tiles(results):
+    # the template's show dicts and the link to the next page, if any
+    page_size = current_app.config['SHOWS_PER_PAGE']
+    data = []
+
+    for result in results[:page_size]:
+        data.append({
+            "id": result.id,
+            # a tile changes when the show, its venue or its artist does
+            "updated_at": max(
+                result.updated_at,
+                result.venue_updated_at,
+                result.artist_updated_at),
+            "venue_id": result.venue_id,
+            "venue_name": result.venue_name,
+            "artist_id": result.artist_id,
+            "artist_name": result.artist_name,
+            "artist_image_link": result.artist_image_link,
+            "start_time": result.start_time
+        })
 
+    next_page = None
+    if len(results) > page_size:
+        last = results[page_size - 1]
+        next_page = url_for('main.shows',
+            after_time=last.start_time.isoformat(),
+            after_id=last.id)
+
+    return data, next_page
+
+
+def venues_validators():
+    # max(updated_at) catches inserts and edits, the count catches deletes
+    # and the latest stats refresh catches changed show counts
+    return tuple(db.session.query(
+        db.func.max(Venue.updated_at),
+        db.func.count(Venue.id),
+        db.session.query(
+            db.func.max(VenueStats.refreshed_at)).scalar_subquery()
+    ).one())
+
+
+def artists_validators():
+    return tuple(db.session.query(
+        db.func.max(Artist.updated_at), db.func.count(Artist.id)).one())
+
+
+def shows_validators():
+    # show rows plus the venue and artist names/images rendered with them.
+    # shows are only deleted along with their venue, so counting venues is
+    # enough to catch deletes without counting the much larger show table
+    return tuple(db.session.query(
+        db.func.max(Show.updated_at),
+        db.session.query(db.func.max(Venue.updated_at)).scalar_subquery(),
+        db.session.query(db.func.count(Venue.id)).scalar_subquery(),
+        db.session.query(db.func.max(Artist.updated_at)).scalar_subquery()
+    ).one())
+
+
+def show_venue_validators(venue_id):
+    # the venue row, its shows, their artists and how many have started
+    updated_at = db.session.query(Venue.updated_at).filter(
+        Venue.id == venue_id).scalar()
+    if updated_at is None:
+        return None
+    shows = db.session.query(
+        db.func.max(Show.updated_at),
+        db.func.max(Artist.updated_at),
+        db.func.count(Show.id),
+        db.func.count(Show.id).filter(Show.start_time < datetime.now())
+    ).join(Artist, Show.artist_id == Artist.id).filter(
+        Show.venue_id == venue_id).one()
+    return (updated_at,) + tuple(shows)
+
+
+def show_artist_validators(artist_id):
+    # the artist row, its shows, their venues and how many have started
+    updated_at = db.session.query(Artist.updated_at).filter(
+        Artist.id == artist_id).scalar()
+    if updated_at is None:
+        return None
+    shows = db.session.query(
+        db.func.max(Show.updated_at),
+        db.func.max(Venue.updated_at),
+        db.func.count(Show.id),
+        db.func.count(Show.id).filter(Show.start_time < datetime.now())
+    ).join(Venue, Show.venue_id == Venue.id).filter(
+        Show.artist_id == artist_id).one()
+    return (updated_at,) + tuple(shows)
+
+
+@jobs.task
+def refresh_stats_job(venue_ids=None, stale_pages=(), stale_prefixes=()):
+    # run after a show is added or removed: the counts /venues reads, then
+    # the cached pages rendered from the old ones, by key and by prefix
+    # (only reachable here with the page cache in Redis when jobs run in
+    # 'flask fyyur worker')
+    refresh_show_stats(venue_ids=venue_ids)
+    db.session.commit()
+    page_cache.invalidate(*stale_pages)
+    for prefix in stale_prefixes:
+        page_cache.invalidate_prefix(prefix)
+
+
+# form fields the edit views write back
+VENUE_EDIT_FIELDS = (
+    'name', 'genres', 'address', 'city', 'state', 'phone', 'facebook_link')
+ARTIST_EDIT_FIELDS = (
+    'name', 'genres', 'city', 'state', 'phone', 'facebook_link')
+
+
+def update_from_form(model, row_id, version, form, fields, **extra):
+    # single UPDATE ... WHERE id = :id AND version = :version RETURNING,
+    # bumping version, also writing any extra column values. Returns None
+    # when the row is gone or someone else saved it since the form was
+    # loaded, instead of overwriting their edit
+    if version is None:
+        return None
+    values = {field: getattr(form, field).data for field in fields}
+    values.update(extra)
+    if 'genres' in values:
+        values['genres'] = normalize_genres(values['genres'])
+    return db.session.execute(
+        db.update(model).where(model.id == row_id).where(
+            model.version == version).values(
+            version=model.version + 1, **values).returning(
+            model.id, model.version)).first()
+
+
+# the exclusion constraints on show, see models.SHOW_DURING
+BOOKING_CONFLICTS = {
+    'show_venue_id_during_excl':
+        'The venue is already booked at that time. Show could not be listed.',
+    'show_artist_id_during_excl':
+        'The artist is already booked at that time. Show could not be listed.',
+}
+
+
+def constraint_name(error):
+    # the constraint an IntegrityError from psycopg2 violated
+    return getattr(getattr(error.orig, 'diag', None), 'constraint_name', None)
+
+
+def booking_conflict(error):
+    # message for an INSERT rejected by one of the exclusion constraints,
+    # None for any other integrity error
+    return BOOKING_CONFLICTS.get(constraint_name(error))
+
+
+def form_errors(form):
+    return '; '.join(
+        '{}: {}'.format(field, ', '.join(errors))
+        for field, errors in form.errors.items())
+
+
+def venue_page_keys(venue_id):
+    # cached pages showing this venue: the listing, its own page and the
+    # pages of artists with shows there. /shows pages are invalidated by
+    # prefix since any of them may list the venue
+    artist_ids = db.session.query(Show.artist_id).filter(
+        Show.venue_id == venue_id).distinct()
+    return [
+        page_key('main.venues'),
+        page_key('main.show_venue', venue_id=venue_id)
+    ] + [
+        page_key('main.show_artist', artist_id=row.artist_id)
+        for row in artist_ids
+    ]
+
+
+def artist_page_keys(artist_id):
+    # cached pages showing this artist, see venue_page_keys
+    venue_ids = db.session.query(Show.venue_id).filter(
+        Show.artist_id == artist_id).distinct()
+    return [
+        page_key('main.artists'),
+        page_key('main.show_artist', artist_id=artist_id)
+    ] + [
+        page_key('main.show_venue', venue_id=row.venue_id)
+        for row in venue_ids
+    ]
 
-app.jinja_env.filters['datetime'] = format_datetime
 
 #----------------------------------------------------------------------------#
 # Controllers.
 #----------------------------------------------------------------------------#
 
 
-@app.route('/')
+@main.route('/')
 def index():
     return render_template('pages/home.html')
 
@@ -178,54 +508,52 @@ def index():
 #  Venues
 #  ----------------------------------------------------------------
 
-@app.route('/venues')
+@main.route('/venues')
+@conditional(venues_validators)
+@page_cache.cached(params=('genre', 'city', 'after'))
 def venues():
     # TODO: replace with real venues data. - DONE
     # num_shows should be aggregated based on number of upcoming shows per
     # venue.
 
-    data = []
+    next_page = None
+    genre, city = listing_filters()
 
     try:
-
-        venues = Venue.query.order_by(Venue.city).all()
-        data = []
-
-        for venue in venues:
-            data.append({
-                "city": venue.city,
-                "state": venue.state,
-                "venues": [{
-                    "id": venue.id,
-                    "name": venue.name,
-                    "num_upcoming_shows": Show.query.filter(Show.venue_id == venue.id).count(),
-                }]
-            })
-
-    except BaseException:
+        if genre is None and city is None:
+            data = venue_areas(db.session.execute(venues_statement()))
+        else:
+            rows, next_page = filtered_page(db.session.execute(
+                filtered_statement(
+                    venues_statement(), Venue,
+                    (Venue.state, Venue.city, Venue.name, Venue.id),
+                    genre, city)).all(), genre, city)
+            data = venue_areas(rows)
+
+    except SQLAlchemyError:
         db.session.rollback()
+        current_app.logger.exception('DB rollback')
+        # an empty listing, but not a 200: the page cache and conditional
+        # leave it alone, so it is gone once the database answers again
+        return render_template(
+            'pages/venues.html', areas=[], genre=genre, city=city,
+            next_page=None), 503
 
-    finally:
-        db.session.close()
-
-    return render_template('pages/venues.html', areas=data)
+    return render_template(
+        'pages/venues.html', areas=data, genre=genre, city=city,
+        next_page=next_page)
 
 
-@app.route('/venues/search', methods=['POST'])
+@main.route('/venues/search', methods=['POST'])
 def search_venues():
     # TODO: implement search on artists with partial string search. Ensure it is case-insensitive. - DONE
     # seach for Hop should return "The Musical Hop".
     # search for "Music" should return "The Musical Hop" and "Park Square Live
     # Music & Coffee"
 
-    # .ilike provides case-insensitive search
-    search_term = request.form.get('search_term')
-    search_results = Venue.query.filter(Venue.name.ilike('%{}%'.format(
-        search_term))).all()  # searches matching items from search form
-
-    response = {}
-    response['count'] = len(search_results)
-    response['data'] = search_results
+    search_term = request.form.get('search_term', '')
+    # searches matching items from search form
+    response = search_by_name(Venue, search_term)
 
     return render_template(
         'pages/search_venues.html',
@@ -235,37 +563,69 @@ def search_venues():
             ''))
 
 
-@app.route('/venues/<int:venue_id>')
+@main.route('/venues/nearby')
+def nearby_venues():
+    # venues within ?radius= km of ?lat=&lng=, closest first, with their
+    # upcoming show counts. The k-d tree in nearby.py finds them; the
+    # database only fills in the matches' names and counts
+    latitude = request.args.get('lat', type=float)
+    longitude = request.args.get('lng', type=float)
+    radius = request.args.get(
+        'radius', current_app.config['NEARBY_RADIUS_KM'], type=float)
+    if latitude is None or longitude is None or \
+            not -90 <= latitude <= 90 or not -180 <= longitude <= 180 or \
+            not 0 < radius <= current_app.config['NEARBY_MAX_RADIUS_KM']:
+        abort(400)
+
+    matches = venue_locations.nearest(
+        latitude, longitude, radius, current_app.config['NEARBY_LIMIT'])
+    rows = {row.id: row for row in db.session.execute(db.select(
+        Venue.id,
+        Venue.name,
+        Venue.city,
+        Venue.state,
+        Venue.address,
+        Venue.latitude,
+        Venue.longitude,
+        db.func.coalesce(
+            VenueStats.upcoming_shows_count, 0).label('num_upcoming_shows')
+    ).outerjoin(VenueStats, VenueStats.venue_id == Venue.id).where(
+        Venue.id.in_([venue_id for _, venue_id in matches])))}
+
+    # a venue deleted by another worker since the last rebuild is skipped
+    data = [
+        dict(rows[venue_id]._mapping, distance_km=round(distance, 3))
+        for distance, venue_id in matches if venue_id in rows
+    ]
+    return jsonify({'count': len(data), 'data': data})
+
+
+@main.route('/venues/<int:venue_id>')
+@conditional(show_venue_validators)
+@page_cache.cached
 def show_venue(venue_id):
     # shows the venue page with the given venue_id
     # TODO: replace with real venue data from the venues table, using venue_id
     # - DONE
-    venue = Venue.query.filter(Venue.id == venue_id).first()
-    past_shows_query = Show.query.join(Artist).filter(
-        Show.venue_id == venue_id).filter(
-        Show.start_time < datetime.now()).all()
+    # venue, its shows and their artists in one joined query
+    venue = Venue.query.options(
+        db.joinedload(Venue.show).joinedload(Show.artist)).filter(
+        Venue.id == venue_id).first()
+    if venue is None:
+        abort(404)
+
+    now = datetime.now()
     past_shows = []
-
-    for show in past_shows_query:
-        past_shows.append({
-            "artist_id": show.artist_id,
-            "artist_name": show.artist.name,
-            "artist_image_link": show.artist.image_link,
-            "start_time": show.start_time.strftime('%Y-%m-%d %H:%M:%S')
-        })
-
-    upcoming_shows_query = Show.query.join(Artist).filter(
-        Show.venue_id == venue_id).filter(
-        Show.start_time >= datetime.now()).all()
     upcoming_shows = []
 
-    for show in upcoming_shows_query:
-        upcoming_shows.append({
-            "artist_id": show.artist_id,
-            "artist_name": show.artist.name,
-            "artist_image_link": show.artist.image_link,
-            "start_time": show.start_time.strftime('%Y-%m-%d %H:%M:%S')
-        })
+    # a show without a start time is neither past nor upcoming
+    for show in sorted(
+            (show for show in venue.show if show.start_time is not None),
+            key=lambda show: show.start_time):
+        if show.start_time < now:
+            past_shows.append(show.show_artist())
+        else:
+            upcoming_shows.append(show.show_artist())
 
     data = venue.venue_to_dictionary()
     data['past_shows'] = past_shows
@@ -279,25 +639,29 @@ def show_venue(venue_id):
 #  Create Venue
 #  ----------------------------------------------------------------
 
-@app.route('/venues/create', methods=['GET'])
+@main.route('/venues/create', methods=['GET'])
 def create_venue_form():
     form = VenueForm()
     return render_template('forms/new_venue.html', form=form)
 
 
-@app.route('/venues/create', methods=['POST'])
+@main.route('/venues/create', methods=['POST'])
 def create_venue_submission():
     # TODO: insert form data as a new Venue record in the db, instead - DONE
     venue_form = VenueForm(request.form)
+    latitude, longitude = geocoding.locate(
+        venue_form.address.data, venue_form.city.data, venue_form.state.data)
 
     venue = Venue(
         name=venue_form.name.data,
         city=venue_form.city.data,
         state=venue_form.state.data,
         address=venue_form.address.data,
+        latitude=latitude,
+        longitude=longitude,
         phone=venue_form.phone.data,
         image_link="https://images.unsplash.com/photo-1537151608828-ea2b11777ee8?ixlib=rb-1.2.1&q=80&fm=jpg&crop=entropy&cs=tinysrgb&w=1080&fit=max&ixid=eyJhcHBfaWQiOjF9",
-        genres=request.form.getlist('genres'),
+        genres=normalize_genres(request.form.getlist('genres')),
         facebook_link=venue_form.facebook_link.data,
     )
     # TODO: modify data to be the data object returned from db insertion - DONE
@@ -305,58 +669,68 @@ def create_venue_submission():
     # on successful db insert, flash success
     # flash('Venue ' + request.form['name'] + ' was successfully listed!')
     try:
-        number = Venue.query.filter(Venue.name == venue.name).count()
-
-        if number == 0:
-            db.session.add(venue)
-            db.session.commit()
-            flash(
-                'Venue ' +
-                request.form['name'] +
-                ' was successfully listed!')
-        else:
-            flash(
-                'Venue ' +
-                request.form['name'] +
-                ' is already listed, please try again!')
+        # the unique constraint on name catches duplicates, no COUNT first
+        db.session.add(venue)
+        db.session.commit()
+        page_cache.invalidate(page_key('main.venues'))
+        page_cache.invalidate_prefix(page_key('main.venues') + '?')
+        suggestions.add('venues', venue.id, venue.name)
+        venue_locations.move(venue.id, latitude, longitude)
+        flash(
+            'Venue ' +
+            request.form['name'] +
+            ' was successfully listed!')
+    except IntegrityError as error:
+        db.session.rollback()
+        if constraint_name(error) != 'venue_name_key':
+            current_app.logger.exception('DB rollback')
+            flash('An error occured. Venue ' + request.form['name'] +
+                  ' could not be listed.')
+            return render_template('pages/home.html')
+        flash(
+            'Venue ' +
+            request.form['name'] +
+            ' is already listed, please try again!')
 
     # TODO: on unsuccessful db insert, flash an error instead. - DONE
     # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
     # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
 
-    except BaseException:
+    except SQLAlchemyError:
         db.session.rollback()
-        print('DB ROLLBACK')
-        print(sys.exc_info())
+        current_app.logger.exception('DB rollback')
         flash(
             'An error occured. Venue ' +
             request.form['name'] +
             ' could not be listed.')
-    finally:
-        print('DB CLOSED')
-        db.session.close()
 
     return render_template('pages/home.html')
 
 
-@app.route('/venues/<venue_id>', methods=['DELETE'])
+@main.route('/venues/<venue_id>', methods=['DELETE'])
 def delete_venue(venue_id):
     # TODO: Complete this endpoint for taking a venue_id, and using - DONE
     # SQLAlchemy ORM to delete a record. Handle cases where the session commit
     # could fail.
 
-    venue = Venue.query.get(venue_id)
+    venue = Venue.query.get_or_404(venue_id)
 
     try:
+        # collected before the shows linking them are deleted
+        stale_pages = venue_page_keys(venue.id)
         Show.query.filter(Show.venue_id == venue.id).delete()
+        # the venue's stats row goes with it (ON DELETE CASCADE)
         db.session.delete(venue)
         db.session.commit()
+        page_cache.invalidate(*stale_pages)
+        page_cache.invalidate_prefix(page_key('main.venues') + '?')
+        suggestions.remove('venues', int(venue_id))
+        venue_locations.remove(int(venue_id))
+        page_cache.invalidate_prefix(page_key('main.shows'))
 
-    except BaseException:
+    except SQLAlchemyError:
         db.session.rollback()
-
-    finally:
-        db.session.close()
+        current_app.logger.exception('DB rollback')
 
     return render_template('pages/home.html')
 
@@ -367,33 +741,35 @@ def delete_venue(venue_id):
 
 #  Artists
 #  ----------------------------------------------------------------
-@app.route('/artists')
+@main.route('/artists')
+@conditional(artists_validators)
+@page_cache.cached(params=('genre', 'city', 'after'))
 def artists():
     # TODO: replace with real data returned from querying the database - DONE
-    artists = Artist.query.order_by(Artist.city).all()
-    data = []
-
-    for artist in artists:
-        data.append({
-            "id": artist.id,
-            "name": artist.name,
-        })
+    next_page = None
+    genre, city = listing_filters()
+    if genre is None and city is None:
+        rows = db.session.execute(artists_statement())
+    else:
+        rows, next_page = filtered_page(db.session.execute(
+            filtered_statement(
+                artists_statement(), Artist, (Artist.name, Artist.id),
+                genre, city)).all(), genre, city)
+    data = [{"id": artist.id, "name": artist.name} for artist in rows]
 
-    return render_template('pages/artists.html', artists=data)
+    return render_template(
+        'pages/artists.html', artists=data, genre=genre, city=city,
+        next_page=next_page)
 
 
-@app.route('/artists/search', methods=['POST'])
+@main.route('/artists/search', methods=['POST'])
 def search_artists():
     # TODO: implement search on artists with partial string search. Ensure it is case-insensitive. - DONE
     # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
     # search for "band" should return "The Wild Sax Band".
-    search_term = request.form.get('search_term')
-    search_results = Artist.query.filter(Artist.name.ilike('%{}%'.format(
-        search_term))).all()  # searches matching items from search form
-
-    response = {}
-    response['count'] = len(search_results)
-    response['data'] = search_results
+    search_term = request.form.get('search_term', '')
+    # searches matching items from search form
+    response = search_by_name(Artist, search_term)
 
     return render_template(
         'pages/search_artists.html',
@@ -403,38 +779,41 @@ def search_artists():
             ''))
 
 
-@app.route('/artists/<int:artist_id>')
+@main.route('/suggest')
+def suggest():
+    # search-as-you-type for both search forms: venue and artist names
+    # starting with q, from the in-process index without touching the
+    # database
+    return jsonify(suggestions.lookup(
+        request.args.get('q', ''), request.args.get('limit', type=int)))
+
+
+@main.route('/artists/<int:artist_id>')
+@conditional(show_artist_validators)
+@page_cache.cached
 def show_artist(artist_id):
     # shows the venue page with the given venue_id
     # TODO: replace with real venue data from the venues table, using venue_id
     # - DONE
-    artist = Artist.query.filter(Artist.id == artist_id).first()
-
-    past_shows_query = Show.query.join(Venue).filter(
-        Show.artist_id == artist_id).filter(
-        Show.start_time < datetime.now()).all()
+    # artist, its shows and their venues in one joined query
+    artist = Artist.query.options(
+        db.joinedload(Artist.show).joinedload(Show.venue)).filter(
+        Artist.id == artist_id).first()
+    if artist is None:
+        abort(404)
+
+    now = datetime.now()
     past_shows = []
-
-    for show in past_shows_query:
-        past_shows.append({
-            "venue_id": show.venue_id,
-            "venue_name": show.venue.name,
-            "artist_image_link": show.venue.image_link,
-            "start_time": show.start_time.strftime('%Y-%m-%d %H:%M:%S')
-        })
-
-    upcoming_shows_query = Show.query.join(Venue).filter(
-        Show.artist_id == artist_id).filter(
-        Show.start_time >= datetime.now()).all()
     upcoming_shows = []
 
-    for show in upcoming_shows_query:
-        upcoming_shows.append({
-            "venue_id": show.venue_id,
-            "venue_name": show.venue.name,
-            "artist_image_link": show.venue.image_link,
-            "start_time": show.start_time.strftime('%Y-%m-%d %H:%M:%S')
-        })
+    # a show without a start time is neither past nor upcoming
+    for show in sorted(
+            (show for show in artist.show if show.start_time is not None),
+            key=lambda show: show.start_time):
+        if show.start_time < now:
+            past_shows.append(show.show_venue())
+        else:
+            upcoming_shows.append(show.show_venue())
 
     data = artist.artist_to_dictionary()
     data['past_shows'] = past_shows
@@ -446,96 +825,107 @@ def show_artist(artist_id):
 
 #  Update
 #  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@main.route('/artists/<int:artist_id>/edit', methods=['GET'])
 def edit_artist(artist_id):
     # TODO: populate form with fields from artist with ID <artist_id> - DONE
-    form = ArtistForm()
-    artist = Artist.query.get(artist_id)
+    artist = Artist.query.get_or_404(artist_id)
+    form = ArtistForm(obj=artist)
 
     return render_template('forms/edit_artist.html', form=form, artist=artist)
 
 
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
+@main.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
     # TODO: take values from the form submitted, and update existing - DONE
     # artist record with ID <artist_id> using the new attributes
 
-    form_artist = ArtistForm(request.form)
+    form_artist = ArtistForm(request.form, meta={'csrf': False})
+    if not form_artist.validate():
+        flash('Problem updating artist: ' + form_errors(form_artist))
+        return redirect(url_for('main.edit_artist', artist_id=artist_id))
 
     try:
-        artist = Artist.query.get(artist_id)
+        updated = update_from_form(
+            Artist, artist_id, request.form.get('version', type=int),
+            form_artist, ARTIST_EDIT_FIELDS)
 
-        artist.name = form_artist.name.data
-        artist.genres = ", ".join(form_artist.genres.data)
-        artist.city = form_artist.city.data
-        artist.state = form_artist.state.data
-        artist.phone = form_artist.phone.data
-        artist.facebook_link = form_artist.facebook_link.data
+        if updated is None:
+            db.session.rollback()
+            flash('This artist was changed by someone else, '
+                  'please review it and try again!')
+            return redirect(url_for('main.edit_artist', artist_id=artist_id))
 
         db.session.commit()
+        page_cache.invalidate(*artist_page_keys(artist_id))
+        page_cache.invalidate_prefix(page_key('main.artists') + '?')
+        suggestions.replace('artists', artist_id, form_artist.name.data)
+        page_cache.invalidate_prefix(page_key('main.shows'))
 
-    except BaseException:
+    except SQLAlchemyError:
         db.session.rollback()
-        print('DB ROLLBACK')
-        print(sys.exc_info())
+        current_app.logger.exception('DB rollback')
         flash(f'Problem updating artist, please try again!')
 
-    finally:
-        print('DB CLOSED')
-        db.session.close()
-
-    return redirect(url_for('show_artist', artist_id=artist_id))
+    return redirect(url_for('main.show_artist', artist_id=artist_id))
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@main.route('/venues/<int:venue_id>/edit', methods=['GET'])
 def edit_venue(venue_id):
     # TODO: populate form with values from venue with ID <venue_id> - DONE
-    form = VenueForm()
-    venue = Venue.query.get(venue_id)
+    venue = Venue.query.get_or_404(venue_id)
+    form = VenueForm(obj=venue)
 
     return render_template('forms/edit_venue.html', form=form, venue=venue)
 
 
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
+@main.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
     # TODO: take values from the form submitted, and update existing - DONE
     # venue record with ID <venue_id> using the new attributes
-    form_venue = VenueForm(request.form)
-
+    form_venue = VenueForm(request.form, meta={'csrf': False})
+    if not form_venue.validate():
+        flash('There was a problem updating the Venue: ' +
+              form_errors(form_venue))
+        return redirect(url_for('main.edit_venue', venue_id=venue_id))
+
+    latitude, longitude = geocoding.locate(
+        form_venue.address.data, form_venue.city.data, form_venue.state.data)
     try:
-        venue = Venue.query.get(venue_id)
+        updated = update_from_form(
+            Venue, venue_id, request.form.get('version', type=int),
+            form_venue, VENUE_EDIT_FIELDS, latitude=latitude,
+            longitude=longitude)
 
-        venue.name = form_venue.name.data
-        venue.genres = ", ".join(form_venue.genres.data)
-        venue.address = form_venue.address.data
-        venue.city = form_venue.city.data
-        venue.state = form_venue.state.data
-        venue.phone = form_venue.phone.data
-        venue.facebook_link = form_venue.facebook_link.data
+        if updated is None:
+            db.session.rollback()
+            flash('This venue was changed by someone else, '
+                  'please review it and try again')
+            return redirect(url_for('main.edit_venue', venue_id=venue_id))
 
         db.session.commit()
-    except BaseException:
+        page_cache.invalidate(*venue_page_keys(venue_id))
+        page_cache.invalidate_prefix(page_key('main.venues') + '?')
+        suggestions.replace('venues', venue_id, form_venue.name.data)
+        venue_locations.move(venue_id, latitude, longitude)
+        page_cache.invalidate_prefix(page_key('main.shows'))
+    except SQLAlchemyError:
         db.session.rollback()
-        print('DB rollback')
-        print(sys.exc_info())
+        current_app.logger.exception('DB rollback')
         flash(f'There was a problem updating the Venue, please try again')
-    finally:
-        print('db closed')
-        db.session.close()
 
-    return redirect(url_for('show_venue', venue_id=venue_id))
+    return redirect(url_for('main.show_venue', venue_id=venue_id))
 
 #  Create Artist
 #  ----------------------------------------------------------------
 
 
-@app.route('/artists/create', methods=['GET'])
+@main.route('/artists/create', methods=['GET'])
 def create_artist_form():
     form = ArtistForm()
     return render_template('forms/new_artist.html', form=form)
 
 
-@app.route('/artists/create', methods=['POST'])
+@main.route('/artists/create', methods=['POST'])
 def create_artist_submission():
     # called upon submitting the new artist listing form
     # TODO: insert form data as a new Venue record in the db, instead - DONE
@@ -547,144 +937,153 @@ def create_artist_submission():
         state=request.form['state'],
         phone=request.form['phone'],
         image_link="https://images.unsplash.com/photo-1537151608828-ea2b11777ee8?ixlib=rb-1.2.1&q=80&fm=jpg&crop=entropy&cs=tinysrgb&w=1080&fit=max&ixid=eyJhcHBfaWQiOjF9",
-        genres=request.form.getlist('genres'),
+        genres=normalize_genres(request.form.getlist('genres')),
         facebook_link=request.form['facebook_link'],
 
     )
     # TODO: modify data to be the data object returned from db insertion - DONE
     try:
-        number = Artist.query.filter(Artist.name == artist.name).count()
-
-        if number == 0:
-            db.session.add(artist)
-            db.session.commit()
-            # on successful db insert, flash success
-            flash(
-                'Artist ' +
-                request.form['name'] +
-                ' was successfully listed!')
-        else:
-            flash(
-                'Artist ' +
-                request.form['name'] +
-                ' is already listed, try again!')
+        # the unique constraint on name catches duplicates, no COUNT first
+        db.session.add(artist)
+        db.session.commit()
+        page_cache.invalidate(page_key('main.artists'))
+        page_cache.invalidate_prefix(page_key('main.artists') + '?')
+        suggestions.add('artists', artist.id, artist.name)
+        # on successful db insert, flash success
+        flash(
+            'Artist ' +
+            request.form['name'] +
+            ' was successfully listed!')
+    except IntegrityError as error:
+        db.session.rollback()
+        if constraint_name(error) != 'artist_name_key':
+            current_app.logger.exception('DB rollback')
+            flash('There was a problem recording the artist ' +
+                  request.form['name'] + ' please try again!')
+            return render_template('pages/home.html')
+        flash(
+            'Artist ' +
+            request.form['name'] +
+            ' is already listed, try again!')
 
-    except BaseException:
+    except SQLAlchemyError:
         db.session.rollback()
-        print('DB ROLLBACK')
-        print(sys.exc_info())
+        current_app.logger.exception('DB rollback')
         # TODO: on unsuccessful db insert, flash an error instead. - DONE
         # e.g., flash('An error occurred. Artist ' + data.name + ' could not be
         # listed.')
         flash('There was a problem recording the artist ' +
               request.form['name'] + ' please try again!')
 
-    finally:
-        print('DB CLOSED')
-        db.session.close()
-
     return render_template('pages/home.html')
 
 
 #  Shows
 #  ----------------------------------------------------------------
 
-@app.route('/shows')
+@main.route('/shows')
+@conditional(shows_validators)
+@page_cache.cached(params=('after_time', 'after_id'))
 def shows():
     # displays list of shows at /shows
     # TODO: replace with real venues data. DONE
     # num_shows should be aggregated based on number of upcoming shows per
     # venue.
-    show = Show.query.all()
-
-    data = []
-
-    for result in show:
-        venue = Venue.query.get(result.venue_id)
-        artist = Artist.query.get(result.artist_id)
-        print(result.start_time)
-        data.append({
-            "venue_id": result.venue_id,
-            "venue_name": venue.name,
-            "artist_id": result.artist_id,
-            "artist_name": artist.name,
-            "artist_image_link": "https://images.unsplash.com/photo-1549213783-8284d0336c4f?ixlib=rb-1.2.1&ixid=eyJhcHBfaWQiOjEyMDd9&auto=format&fit=crop&w=300&q=80",
-            "start_time": (result.start_time).strftime("%m/%d/%Y, %H:%M")
-        })
+    data, next_page = show_tiles(
+        db.session.execute(shows_statement()).all())
 
-    return render_template('pages/shows.html', shows=data)
+    return render_template('pages/shows.html', shows=data, next_page=next_page)
 
 
-@app.route('/shows/create')
+@main.route('/shows/create')
 def create_shows():
     # renders form. do not touch.
     form = ShowForm()
     return render_template('forms/new_show.html', form=form)
 
 
-@app.route('/shows/create', methods=['POST'])
+@main.route('/shows/create', methods=['POST'])
 def create_show_submission():
     # called to create new shows in the db, upon submitting new show listing form
     # TODO: insert form data as a new Show record in the db, instead - DONE
 
-    show_form = ShowForm(request.form)
+    show_form = ShowForm(request.form, meta={'csrf': False})
+    if not show_form.validate():
+        flash('Show could not be listed: ' + form_errors(show_form))
+        return render_template('forms/new_show.html', form=show_form)
 
     show = Show(
         artist_id=show_form.artist_id.data,
         venue_id=show_form.venue_id.data,
         start_time=show_form.start_time.data,
+        duration=show_form.duration.data,
     )
 
     try:
         db.session.add(show)
+        jobs.after_commit(
+            refresh_stats_job,
+            venue_ids=[show.venue_id],
+            stale_pages=[page_key('main.venues')],
+            stale_prefixes=[page_key('main.venues') + '?'])
         db.session.commit()
+        page_cache.invalidate(
+            page_key('main.venues'),
+            page_key('main.show_venue', venue_id=show_form.venue_id.data),
+            page_key('main.show_artist', artist_id=show_form.artist_id.data))
+        page_cache.invalidate_prefix(page_key('main.venues') + '?')
+        page_cache.invalidate_prefix(page_key('main.shows'))
         # on successful db insert, flash success
         flash('Show was successfully listed!')
-    except BaseException:
+    except IntegrityError as error:
         db.session.rollback()
-        print('DB ROLLBACK')
-        print(sys.exc_info())
+        flash(booking_conflict(error) or
+              'An error occurred. Show could not be listed.')
+    except SQLAlchemyError:
+        db.session.rollback()
+        current_app.logger.exception('DB rollback')
         # TODO: on unsuccessful db insert, flash an error instead. - DONE
         # e.g., flash('An error occurred. Show could not be listed.')
         # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
         flash('An error occurred. Show could not be listed.')
-    finally:
-        print('DB CLOSE')
-        db.session.close()
 
     return render_template('pages/home.html')
 
 
-@app.errorhandler(404)
+@main.route('/cache/stats')
+def cache_stats():
+    # hit/miss counters per cached page, for tuning CACHE_TIMEOUTS
+    return jsonify(page_cache.stats())
+
+
+@main.route('/metrics')
+def metrics_endpoint():
+    # Prometheus text format, see metrics.py
+    return Response(
+        metrics.exposition(), mimetype='text/plain; version=0.0.4')
+
+
+@main.app_errorhandler(404)
 def not_found_error(error):
     return render_template('errors/404.html'), 404
 
 
-@app.errorhandler(500)
+@main.app_errorhandler(500)
 def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(Formatter(
-        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'))
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
-
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
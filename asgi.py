@@ -0,0 +1,266 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import asyncio
+import itertools
+import re
+from datetime import datetime
+
+from flask import render_template, request
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from werkzeug.exceptions import HTTPException, NotFound
+
+from app import (
+    create_app, search_statement, search_results, venues_statement,
+    venue_areas, artists_statement, shows_statement, show_tiles)
+from models import Venue, Artist, Show
+from replicas import replicas
+
+#----------------------------------------------------------------------------#
+# ASGI entry point.
+#
+# The read pages are served on SQLAlchemy's asyncio engine (asyncpg), so a
+# worker waiting on Postgres keeps serving other requests; everything else
+# goes to the regular Flask app on a thread pool. Run it with any ASGI
+# server, e.g. "uvicorn --workers 4 asgi:application". Needs the optional
+# asyncpg and asgiref packages. Pages served here skip the page cache and
+# ETags: the point is to see how far the database alone goes.
+#----------------------------------------------------------------------------#
+
+
+def async_database_uri(uri):
+    return str(make_url(uri).set(drivername='postgresql+asyncpg'))
+
+
+def create_async_engine(config, uri=None):
+    from sqlalchemy.ext.asyncio import create_async_engine
+    options = {
+        'pool_size': config['DB_POOL_SIZE'],
+        'max_overflow': config['DB_MAX_OVERFLOW'],
+        'pool_timeout': config['DB_POOL_TIMEOUT'],
+        'pool_recycle': config['DB_POOL_RECYCLE'],
+        'pool_pre_ping': config['DB_POOL_PRE_PING'],
+        'connect_args': {'server_settings': {
+            'statement_timeout': str(config['DB_STATEMENT_TIMEOUT_MS'])}},
+    }
+    if config['DB_PGBOUNCER']:
+        # PgBouncer in transaction mode: no client pool, and asyncpg's
+        # prepared statement cache would outlive the server connection
+        from sqlalchemy.pool import NullPool
+        options = {
+            'poolclass': NullPool,
+            'connect_args': {'statement_cache_size': 0},
+        }
+    return create_async_engine(
+        uri or config.get('ASYNC_DATABASE_URI') or
+        async_database_uri(config['SQLALCHEMY_DATABASE_URI']), **options)
+
+
+#----------------------------------------------------------------------------#
+# Views.
+#----------------------------------------------------------------------------#
+
+class Views(object):
+    # each view runs inside a Flask request context (for request.args,
+    # url_for and the templates) and awaits its queries on the async engine
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    async def all(self, statement):
+        async with self.engine.connect() as connection:
+            return (await connection.execute(statement)).all()
+
+    async def first(self, statement):
+        async with self.engine.connect() as connection:
+            return (await connection.execute(statement)).first()
+
+    async def venues(self):
+        return render_template(
+            'pages/venues.html',
+            areas=venue_areas(await self.all(venues_statement())))
+
+    async def artists(self):
+        return render_template('pages/artists.html', artists=[
+            {"id": artist.id, "name": artist.name}
+            for artist in await self.all(artists_statement())
+        ])
+
+    async def shows(self):
+        data, next_page = show_tiles(await self.all(shows_statement()))
+        return render_template(
+            'pages/shows.html', shows=data, next_page=next_page)
+
+    async def search(self, model, template):
+        search_term = request.form.get('search_term', '')
+        return render_template(
+            template,
+            results=search_results(
+                await self.all(search_statement(model, search_term))),
+            search_term=search_term)
+
+    async def search_venues(self):
+        return await self.search(Venue, 'pages/search_venues.html')
+
+    async def search_artists(self):
+        return await self.search(Artist, 'pages/search_artists.html')
+
+    async def detail(self, model, owner_id, show_key, other, prefix, now):
+        # the row, its past and its upcoming shows as three concurrent
+        # queries, each on a connection of its own
+        shows = select(
+            getattr(Show, prefix + '_id'),
+            other.name.label(prefix + '_name'),
+            other.image_link.label(prefix + '_image_link'),
+            Show.start_time
+        ).join(other, getattr(Show, prefix + '_id') == other.id).where(
+            show_key == owner_id).order_by(Show.start_time)
+        row, past, upcoming = await asyncio.gather(
+            self.first(select(model.__table__).where(model.id == owner_id)),
+            self.all(shows.where(Show.start_time < now)),
+            self.all(shows.where(Show.start_time >= now)))
+        if row is None:
+            raise NotFound()
+        return (
+            dict(row._mapping),
+            [dict(show._mapping) for show in past],
+            [dict(show._mapping) for show in upcoming])
+
+    async def show_venue(self, venue_id):
+        data, past_shows, upcoming_shows = await self.detail(
+            Venue, int(venue_id), Show.venue_id, Artist, 'artist',
+            datetime.now())
+        data['past_shows'] = past_shows
+        data['upcoming_shows'] = upcoming_shows
+        data['past_shows_count'] = len(past_shows)
+        data['upcoming_shows_count'] = len(upcoming_shows)
+        return render_template('pages/show_venue.html', venue=data)
+
+    async def show_artist(self, artist_id):
+        data, past_shows, upcoming_shows = await self.detail(
+            Artist, int(artist_id), Show.artist_id, Venue, 'venue',
+            datetime.now())
+        data['past_shows'] = past_shows
+        data['upcoming_shows'] = upcoming_shows
+        data['past_shows_count'] = len(past_shows)
+        data['upcoming_shows_count'] = len(upcoming_shows)
+        return render_template('pages/show_artist.html', artist=data)
+
+
+# (method, path, view name)
+ROUTES = [
+    ('GET', re.compile(r'^/venues$'), 'venues'),
+    ('GET', re.compile(r'^/artists$'), 'artists'),
+    ('GET', re.compile(r'^/shows$'), 'shows'),
+    ('GET', re.compile(r'^/venues/(\d+)$'), 'show_venue'),
+    ('GET', re.compile(r'^/artists/(\d+)$'), 'show_artist'),
+    ('POST', re.compile(r'^/venues/search$'), 'search_venues'),
+    ('POST', re.compile(r'^/artists/search$'), 'search_artists'),
+]
+
+
+#----------------------------------------------------------------------------#
+# Application.
+#----------------------------------------------------------------------------#
+
+class AsyncReadApp(object):
+
+    def __init__(self, app):
+        # optional dependency, only needed for the ASGI entry point
+        from asgiref.wsgi import WsgiToAsgi
+        self.app = app
+        self.wsgi = WsgiToAsgi(app)
+        self.engines = None
+        self._turn = itertools.count()
+
+    def engine(self):
+        # for the requests replicas.py sends to a replica in the Flask app
+        # (GETs from browsers not pinned to the primary after a write), one
+        # of DB_REPLICA_URLS picked round robin; the primary otherwise
+        if self.engines is None:
+            self.engines = [create_async_engine(self.app.config)] + [
+                create_async_engine(self.app.config, async_database_uri(url))
+                for url in self.app.config['DB_REPLICA_URLS']]
+        primary, replica_engines = self.engines[0], self.engines[1:]
+        if not replica_engines or not replicas.reads_from_replica():
+            return primary
+        return replica_engines[next(self._turn) % len(replica_engines)]
+
+    def route(self, scope):
+        # the genre and city filters on the listings are left to the Flask
+        # app, see filtered_statement in app.py
+        if scope['path'] in ('/venues', '/artists') and scope.get(
+                'query_string'):
+            return None, None
+        for method, pattern, name in ROUTES:
+            match = pattern.match(scope['path'])
+            if match and scope['method'] == method:
+                return name, match.groups()
+        return None, None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        name, args = self.route(scope) if scope['type'] == 'http' else (None, None)
+        if name is None:
+            return await self.wsgi(scope, receive, send)
+
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+
+        headers = {
+            key.decode('latin-1'): value.decode('latin-1')
+            for key, value in scope['headers']
+        }
+        # a Flask request context per request, so flashes, url_for, the
+        # error handlers and after_request hooks behave as under WSGI
+        with self.app.test_request_context(
+                scope['path'],
+                base_url='{}://{}'.format(
+                    scope.get('scheme', 'http'),
+                    headers.get('host', 'localhost')),
+                method=scope['method'],
+                query_string=scope.get('query_string', b''),
+                headers=headers,
+                data=body):
+            try:
+                response = self.app.preprocess_request()
+                if response is None:
+                    response = await getattr(
+                        Views(self.engine()), name)(*args)
+            except HTTPException as error:
+                response = self.app.handle_user_exception(error)
+            except Exception as error:
+                response = self.app.handle_exception(error)
+            response = self.app.process_response(
+                self.app.make_response(response))
+
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': [
+                (key.lower().encode('latin-1'), value.encode('latin-1'))
+                for key, value in response.headers.items()
+            ],
+        })
+        await send({'type': 'http.response.body', 'body': response.get_data()})
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                for engine in self.engines or ():
+                    await engine.dispose()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+
+application = AsyncReadApp(create_app())
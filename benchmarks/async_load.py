@@ -0,0 +1,107 @@
+"""Compare the WSGI app and the ASGI entry point under concurrent load.
+
+Start both servers against the same seeded database, with
+CACHE_BACKEND = None in config.py so every request reaches Postgres:
+
+    gunicorn -w 4 -b 127.0.0.1:8000 'app:create_app()'
+    uvicorn --workers 4 --port 8001 asgi:application
+
+then run:
+
+    python benchmarks/async_load.py http://127.0.0.1:8000 http://127.0.0.1:8001
+
+Each server gets CONCURRENCY open connections (HTTP/1.1 keep-alive) that
+request the read pages in turn for DURATION seconds. Prints requests per
+second, p50/p95/p99 latency and errors per server.
+"""
+import asyncio
+import os
+import sys
+import time
+from urllib.parse import urlsplit
+
+CONCURRENCY = int(os.environ.get('CONCURRENCY', 500))
+DURATION = float(os.environ.get('DURATION', 30))
+PAGES = ('/venues', '/artists', '/shows', '/venues/1', '/artists/1')
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def get(reader, writer, host, path):
+    writer.write(
+        'GET {} HTTP/1.1\r\nHost: {}\r\n\r\n'.format(path, host).encode())
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.lower() == 'content-length':
+            length = int(value)
+    await reader.readexactly(length)
+    return status
+
+
+async def connection(url, number, deadline, latencies, errors):
+    parts = urlsplit(url)
+    reader = writer = None
+    i = number
+    while time.monotonic() < deadline:
+        path = PAGES[i % len(PAGES)]
+        i += 1
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(
+                    parts.hostname, parts.port or 80)
+            status = await get(reader, writer, parts.netloc, path)
+        except (OSError, ValueError, IndexError,
+                asyncio.IncompleteReadError):
+            errors.append('connection')
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+        if status >= 400:
+            errors.append(status)
+        else:
+            latencies.append((time.perf_counter() - started) * 1000)
+    if writer is not None:
+        writer.close()
+
+
+async def load(url):
+    latencies = []
+    errors = []
+    started = time.monotonic()
+    deadline = started + DURATION
+    await asyncio.gather(*(
+        connection(url, number, deadline, latencies, errors)
+        for number in range(CONCURRENCY)))
+    elapsed = time.monotonic() - started
+    if not latencies:
+        print('{:<28} no successful requests, {} errors'.format(
+            url, len(errors)))
+        return
+    print('{:<28} {:>8.1f} req/s  p50 {:>8.2f}  p95 {:>8.2f}  p99 {:>8.2f} ms'
+          '  {} errors'.format(
+              url, len(latencies) / elapsed, percentile(latencies, 0.50),
+              percentile(latencies, 0.95), percentile(latencies, 0.99),
+              len(errors)))
+
+
+def main():
+    urls = sys.argv[1:] or ['http://127.0.0.1:8000', 'http://127.0.0.1:8001']
+    print('{} connections, {:.0f}s per server'.format(CONCURRENCY, DURATION))
+    for url in urls:
+        asyncio.run(load(url))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""Time /venues/nearby lookups on the k-d tree against a full scan.
+
+Places VENUES generated venues around their city centres (no database
+needed), builds the tree, and asks for the NEARBY_LIMIT closest venues
+within RADIUS_KM of LOOKUPS random points near those cities:
+
+    python benchmarks/nearby.py
+
+Prints the build time and p50/p99 per lookup for the tree and for a
+brute-force scan of every venue, and exits with status 1 if the two ever
+disagree.
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from dataset import venue_rows  # noqa: E402
+from nearby import KDTree, km_to_chord, to_point  # noqa: E402
+
+VENUES = int(os.environ.get('VENUES', 100000))
+LOOKUPS = int(os.environ.get('LOOKUPS', 200))
+RADIUS_KM = float(os.environ.get('RADIUS_KM', 25))
+LIMIT = int(os.environ.get('NEARBY_LIMIT', 50))
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def scan(points, target, max_chord):
+    found = []
+    for x, y, z, row_id in points:
+        distance = (x - target[0]) ** 2 + (y - target[1]) ** 2 + \
+            (z - target[2]) ** 2
+        if distance <= max_chord * max_chord:
+            found.append((distance, row_id))
+    return sorted(found)[:LIMIT]
+
+
+def main():
+    rng = random.Random(0)
+    venues = list(venue_rows(rng, VENUES))
+    points = [
+        to_point(venue['latitude'], venue['longitude']) + (row_id,)
+        for row_id, venue in enumerate(venues, 1)
+    ]
+
+    started = time.perf_counter()
+    tree = KDTree(points)
+    print('{} venues indexed in {:.1f}s'.format(
+        len(points), time.perf_counter() - started))
+
+    max_chord = km_to_chord(RADIUS_KM)
+    tree_times = []
+    scan_times = []
+    mismatches = 0
+    for venue in rng.sample(venues, min(LOOKUPS, len(venues))):
+        target = to_point(venue['latitude'] + rng.uniform(-0.05, 0.05),
+                          venue['longitude'] + rng.uniform(-0.05, 0.05))
+        started = time.perf_counter()
+        found = tree.nearest(target, LIMIT, max_chord)
+        tree_times.append((time.perf_counter() - started) * 1000)
+        started = time.perf_counter()
+        expected = scan(points, target, max_chord)
+        scan_times.append((time.perf_counter() - started) * 1000)
+        # ties at the same distance may come back in either order
+        if [distance for distance, _ in found] != \
+                [distance for distance, _ in expected]:
+            mismatches += 1
+
+    for label, times in (('k-d tree', tree_times), ('full scan', scan_times)):
+        print('{:<10} p50 {:>9.3f} ms  p99 {:>9.3f} ms'.format(
+            label, percentile(times, 0.50), percentile(times, 0.99)))
+    if mismatches:
+        print('{} lookups disagree with the full scan'.format(mismatches))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Time template rendering of /shows and /venues across page sizes.
+
+Needs no database: pages are rendered from synthetic rows inside a test
+request context.
+
+    python benchmarks/render.py
+
+For each size it reports the median render time without fragment caching,
+with a cold fragment cache (first render fills it) and with a warm one.
+"""
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+from flask import render_template
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from app import create_app  # noqa: E402
+from cache import MemoryCache, NullCache  # noqa: E402
+
+SIZES = (10, 100, 1000, 5000)
+REPEAT = 5
+UPDATED_AT = datetime(2020, 5, 1, 12, 0)
+
+
+def shows(size):
+    start = datetime(2020, 6, 1, 20, 0)
+    return [{
+        'id': i,
+        'updated_at': UPDATED_AT,
+        'venue_id': i % 50,
+        'venue_name': 'Venue {}'.format(i % 50),
+        'artist_id': i % 200,
+        'artist_name': 'Artist {}'.format(i % 200),
+        'artist_image_link': 'https://example.com/{}.jpg'.format(i % 200),
+        'start_time': start + timedelta(hours=i),
+    } for i in range(size)]
+
+
+def areas(size):
+    return [{
+        'city': 'City {}'.format(area),
+        'state': 'CA',
+        'venues': [{
+            'id': area * 10 + i,
+            'name': 'Venue {}'.format(area * 10 + i),
+            'updated_at': UPDATED_AT,
+            'num_upcoming_shows': i,
+        } for i in range(10)],
+    } for area in range(max(1, size // 10))]
+
+
+def median_ms(render, repeat=REPEAT):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        render()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    app = create_app()
+    env = app.jinja_env
+    pages = (
+        ('pages/shows.html', '/shows', 'shows', shows),
+        ('pages/venues.html', '/venues', 'areas', areas),
+    )
+
+    print('{:<18} {:>6} {:>10} {:>10} {:>10}'.format(
+        'template', 'rows', 'off ms', 'cold ms', 'warm ms'))
+    for template, path, name, build in pages:
+        for size in SIZES:
+            context = {name: build(size)}
+            with app.test_request_context(path):
+                def render():
+                    return render_template(template, **context)
+
+                render()  # compile the template once
+                env.fragment_cache = NullCache()
+                off = median_ms(render)
+
+                env.fragment_cache = MemoryCache(size * 2)
+                cold = median_ms(render, repeat=1)
+                warm = median_ms(render)
+            print('{:<18} {:>6} {:>10.2f} {:>10.2f} {:>10.2f}'.format(
+                template, size, off, cold, warm))
+
+
+if __name__ == '__main__':
+    main()
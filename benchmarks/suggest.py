@@ -0,0 +1,72 @@
+"""Time /suggest lookups on the in-process prefix index at 1M names.
+
+Builds a PrefixIndex from NAMES generated venue and artist names (no
+database needed) and looks up LOOKUPS random prefixes of 1 to 6
+characters taken from those names:
+
+    python benchmarks/suggest.py
+
+Prints the build time, and p50/p99 per lookup for the top SUGGEST_LIMIT
+matches. Exits with status 1 if p99 is over a millisecond.
+"""
+import os
+import random
+import sys
+import time
+from itertools import chain
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), os.pardir))
+
+from dataset import artist_rows, venue_rows  # noqa: E402
+from suggest import PrefixIndex  # noqa: E402
+
+NAMES = int(os.environ.get('NAMES', 1000000))
+LOOKUPS = int(os.environ.get('LOOKUPS', 100000))
+LIMIT = int(os.environ.get('SUGGEST_LIMIT', 10))
+
+
+def percentile(samples, fraction):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def main():
+    rng = random.Random(0)
+    names = [row['name'] for row in chain(
+        venue_rows(rng, NAMES // 2), artist_rows(rng, NAMES - NAMES // 2))]
+
+    started = time.perf_counter()
+    index = PrefixIndex(enumerate(names, 1))
+    print('{} names ({} keys) indexed in {:.1f}s'.format(
+        len(names), len(index), time.perf_counter() - started))
+
+    prefixes = []
+    for name in rng.sample(names, min(LOOKUPS, len(names))):
+        words = name.split()
+        word = ' '.join(words[rng.randint(0, 1):])
+        prefixes.append(word[:rng.randint(1, 6)])
+
+    latencies = []
+    found = 0
+    for prefix in prefixes:
+        started = time.perf_counter()
+        found += len(index.lookup(prefix, LIMIT))
+        latencies.append((time.perf_counter() - started) * 1000)
+    p99 = percentile(latencies, 0.99)
+    print('{} lookups: p50 {:.4f} ms  p99 {:.4f} ms  ({:.1f} matches '
+          'each)'.format(len(latencies), percentile(latencies, 0.50), p99,
+                         found / len(latencies)))
+
+    started = time.perf_counter()
+    index.add(len(names) + 1, 'The Newest Room')
+    index.replace(len(names) + 1, 'The Renamed Room')
+    index.remove(len(names) + 1)
+    print('add, rename and remove one name: {:.1f} ms'.format(
+        (time.perf_counter() - started) * 1000))
+    if p99 > 1:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,303 @@
+import hashlib
+import pickle
+import threading
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime, timezone
+from functools import wraps
+from urllib.parse import urlencode
+
+from flask import Response, current_app, g, make_response, request, \
+    session, url_for
+from jinja2 import nodes
+from jinja2.ext import Extension
+
+
+#----------------------------------------------------------------------------#
+# Backends.
+#----------------------------------------------------------------------------#
+
+class MemoryCache(object):
+    # in-process LRU with a per-entry TTL, shared by the threads of a worker
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def delete_prefix(self, prefix):
+        with self._lock:
+            for key in [key for key in self._entries if key.startswith(prefix)]:
+                del self._entries[key]
+
+
+class RedisCache(object):
+    # any Redis-compatible server, shared by every worker
+
+    def __init__(self, url, key_prefix='fyyur:'):
+        # optional dependency, only needed with CACHE_BACKEND = 'redis'
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.key_prefix = key_prefix
+
+    def get(self, key):
+        value = self.client.get(self.key_prefix + key)
+        return None if value is None else pickle.loads(value)
+
+    def set(self, key, value, timeout):
+        self.client.set(
+            self.key_prefix + key, pickle.dumps(value), ex=int(timeout))
+
+    def delete(self, *keys):
+        if keys:
+            self.client.delete(*[self.key_prefix + key for key in keys])
+
+    def delete_prefix(self, prefix):
+        keys = list(self.client.scan_iter(match=self.key_prefix + prefix + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+class NullCache(object):
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, timeout):
+        pass
+
+    def delete(self, *keys):
+        pass
+
+    def delete_prefix(self, prefix):
+        pass
+
+
+#----------------------------------------------------------------------------#
+# Page cache.
+#----------------------------------------------------------------------------#
+
+def page_key(endpoint, **values):
+    # cache key for a page: its route with ids and query string filled in,
+    # e.g. page_key('show_venue', venue_id=3) -> 'page:/venues/3'
+    return 'page:' + url_for(endpoint, **values)
+
+
+def request_page_key(params):
+    # cache key for the current request: its path, as page_key builds it,
+    # plus the given query args in sorted order. Pages with a query string
+    # are invalidated by prefix, e.g. page_key('main.venues') + '?'
+    key = 'page:' + request.script_root + request.path
+    query = urlencode(sorted(
+        (name, value) for name in params
+        for value in request.args.getlist(name)))
+    return key + '?' + query if query else key
+
+
+# set for the replica lag window after any invalidation, see PageCache.cached
+INVALIDATED_KEY = 'invalidated'
+
+
+class PageCache(object):
+    # caches the rendered body of read-only pages. Write views call
+    # invalidate() with the keys they affect once their commit succeeds.
+    # Under @conditional a body is stored with the ETag it was rendered
+    # for and only served while the validators still give that ETag, so a
+    # worker that missed an invalidation (each has its own memory backend)
+    # or counts that moved without one re-render instead of serving a
+    # stale body under a fresh ETag.
+
+    def __init__(self, app=None):
+        self.backend = NullCache()
+        self.timeouts = {}
+        self.default_timeout = 60
+        self.hits = Counter()
+        self.misses = Counter()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend = app.config.get('CACHE_BACKEND')
+        if backend == 'memory':
+            self.backend = MemoryCache(app.config['CACHE_MAX_ENTRIES'])
+        elif backend == 'redis':
+            self.backend = RedisCache(app.config['CACHE_REDIS_URL'])
+        else:
+            self.backend = NullCache()
+        self.default_timeout = app.config.get('CACHE_DEFAULT_TIMEOUT', 60)
+        self.timeouts = app.config.get('CACHE_TIMEOUTS', {})
+        self.replica_lag = app.config.get('DB_READ_YOUR_WRITES_SECONDS', 10)
+        app.extensions['page_cache'] = self
+
+    def cached(self, view=None, params=()):
+        # @page_cache.cached, or @page_cache.cached(params=('genre', ...))
+        # naming the query args the view reads: only those are part of the
+        # key, so other args neither split the cache nor reach url_for
+        if view is None:
+            return lambda view: self.cached(view, params)
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # a pending flash message is rendered into the page, and a
+            # browser pinned to the primary after a write must not get a
+            # page rendered from a replica that is behind, so those
+            # requests neither read nor fill the cache
+            router = current_app.extensions.get('replicas')
+            if session.get('_flashes') or (
+                    router is not None and router.pinned()):
+                return view(*args, **kwargs)
+
+            endpoint = request.endpoint
+            key = request_page_key(params)
+            etag = g.get('page_etag')
+            entry = self.backend.get(key)
+            if isinstance(entry, tuple) and entry[0] == etag:
+                self.hits[endpoint] += 1
+                return entry[1]
+
+            self.misses[endpoint] += 1
+            body = view(*args, **kwargs)
+            # shortly after an invalidation a replica may not have the write
+            # yet, and a page rendered from it would go back into the cache
+            # for its whole timeout
+            if isinstance(body, str) and not (
+                    router is not None and router.reads_from_replica() and
+                    self.backend.get(INVALIDATED_KEY)):
+                self.backend.set(
+                    key, (etag, body),
+                    self.timeouts.get(endpoint, self.default_timeout))
+            return body
+        return wrapper
+
+    def invalidate(self, *keys):
+        self.backend.delete(*keys)
+        self.backend.set(INVALIDATED_KEY, True, self.replica_lag)
+
+    def invalidate_prefix(self, prefix):
+        self.backend.delete_prefix(prefix)
+        self.backend.set(INVALIDATED_KEY, True, self.replica_lag)
+
+    def stats(self):
+        return {
+            endpoint: {
+                'hits': self.hits[endpoint],
+                'misses': self.misses[endpoint],
+            }
+            for endpoint in set(self.hits) | set(self.misses)
+        }
+
+
+#----------------------------------------------------------------------------#
+# Conditional GET.
+#----------------------------------------------------------------------------#
+
+def conditional(validators):
+    # answers If-None-Match / If-Modified-Since with a 304 before the view
+    # runs. validators(**view_args) returns the values the page is built
+    # from (updated_at timestamps, row counts, ...) or None to skip the check.
+    # Last-Modified is only sent when they are all timestamps: a delete
+    # changes a count but moves no timestamp, so only the ETag catches it.
+    # The ETag is left in g.page_etag for PageCache.cached below it
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            if session.get('_flashes'):
+                return view(*args, **kwargs)
+            values = validators(**kwargs)
+            if values is None:
+                return view(*args, **kwargs)
+
+            etag = hashlib.sha1(
+                repr((request.full_path, values)).encode('utf-8')).hexdigest()
+            timestamps = [value for value in values if value is not None]
+            last_modified = None
+            if timestamps and all(
+                    isinstance(value, datetime) for value in timestamps):
+                last_modified = max(timestamps).replace(
+                    microsecond=0, tzinfo=timezone.utc)
+
+            if request.if_none_match:
+                fresh = request.if_none_match.contains_weak(etag)
+            elif request.if_modified_since and last_modified:
+                since = request.if_modified_since
+                if since.tzinfo is None:
+                    since = since.replace(tzinfo=timezone.utc)
+                fresh = last_modified <= since
+            else:
+                fresh = False
+
+            if fresh:
+                response = Response(status=304)
+            else:
+                g.page_etag = etag
+                response = make_response(view(*args, **kwargs))
+                # an error page is not what the validators describe
+                if response.status_code != 200:
+                    return response
+            response.set_etag(etag, weak=True)
+            if last_modified:
+                response.last_modified = last_modified
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
+
+#----------------------------------------------------------------------------#
+# Template fragments.
+#----------------------------------------------------------------------------#
+
+class FragmentCacheExtension(Extension):
+    # {% cache 'show', show.id, show.updated_at %}...{% endcache %} renders
+    # the body once per distinct key and serves it from
+    # environment.fragment_cache afterwards. Keys should include updated_at
+    # so edited rows simply stop matching their old fragment.
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super(FragmentCacheExtension, self).__init__(environment)
+        environment.extend(
+            fragment_cache=NullCache(), fragment_cache_timeout=3600)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        key = [parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            key.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(
+            self.call_method('_render', [nodes.List(key)]), [], [], body
+        ).set_lineno(lineno)
+
+    def _render(self, key, caller):
+        key = 'fragment:' + ':'.join(str(part) for part in key)
+        fragment = self.environment.fragment_cache.get(key)
+        if fragment is None:
+            fragment = caller()
+            self.environment.fragment_cache.set(
+                key, fragment, self.environment.fragment_cache_timeout)
+        return fragment
@@ -0,0 +1,402 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import csv
+import json
+import time
+from datetime import datetime
+
+import click
+from flask.cli import AppGroup
+from sqlalchemy import bindparam
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from werkzeug.datastructures import MultiDict
+
+from dataset import generate
+from forms import ArtistForm, ShowForm, VenueForm, normalize_genres
+from geocode import geocoding
+from jobs import RedisBackend, jobs
+from models import db, Venue, Artist, Show
+from stats import refresh_show_stats
+
+fyyur_cli = AppGroup('fyyur', help='Bulk import and export of Fyyur data.')
+
+#----------------------------------------------------------------------------#
+# Entities.
+#----------------------------------------------------------------------------#
+
+# form used to validate each imported record, model it loads into, the
+# columns written, and the unique column upserts resolve on (None: append)
+ENTITIES = {
+    'venues': {
+        'form': VenueForm,
+        'model': Venue,
+        'fields': ('name', 'city', 'state', 'address', 'phone', 'image_link',
+                   'genres', 'facebook_link'),
+        'conflict': 'name',
+    },
+    'artists': {
+        'form': ArtistForm,
+        'model': Artist,
+        'fields': ('name', 'city', 'state', 'phone', 'image_link', 'genres',
+                   'facebook_link'),
+        'conflict': 'name',
+    },
+    'shows': {
+        'form': ShowForm,
+        'model': Show,
+        'fields': ('artist_id', 'venue_id', 'start_time', 'duration'),
+        'conflict': None,
+        # ShowForm keeps the ids as strings
+        'coerce': {'artist_id': int, 'venue_id': int},
+    },
+}
+
+# ShowForm.start_time's format, so exported shows import unchanged
+DATETIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def read_records(stream, format):
+    # yields one MultiDict per record; list values (genres) become repeated
+    # keys, which is how the forms receive them from a browser
+    if format == 'csv':
+        for record in csv.DictReader(stream):
+            yield to_multidict(normalized(record))
+    else:
+        for line in stream:
+            if line.strip():
+                yield to_multidict(normalized(json.loads(line)))
+
+
+def normalized(record):
+    # genres as the vocabulary names the forms accept, in any case, as a
+    # list or comma-joined
+    if record.get('genres'):
+        record['genres'] = normalize_genres(record['genres'])
+    return record
+
+
+def to_multidict(record):
+    items = []
+    for key, value in record.items():
+        if isinstance(value, list):
+            items.extend((key, item) for item in value)
+        elif value is not None:
+            items.append((key, str(value)))
+    return MultiDict(items)
+
+
+class Progress(object):
+
+    def __init__(self, label):
+        self.label = label
+        self.rows = 0
+        self.started = time.perf_counter()
+
+    def add(self, rows):
+        self.rows += rows
+        elapsed = time.perf_counter() - self.started
+        click.echo('{}: {} rows, {:.0f} rows/sec'.format(
+            self.label, self.rows, self.rows / elapsed if elapsed else 0),
+            err=True)
+
+
+#----------------------------------------------------------------------------#
+# Import.
+#----------------------------------------------------------------------------#
+
+def load_batch(entity, rows):
+    # the whole batch goes out as one multi-row INSERT. Returns how many
+    # rows were skipped for overlapping a show already booked
+    if entity['conflict']:
+        # one row per name, or Postgres rejects the batch for touching the
+        # same row twice; the last occurrence wins as it would on re-import
+        rows = list({row[entity['conflict']]: row for row in rows}.values())
+    table = entity['model'].__table__
+    statement = insert(table).values(rows)
+    if entity['conflict']:
+        # every column the rows carry, geocoded coordinates included
+        values = {
+            field: statement.excluded[field]
+            for field in rows[0] if field != entity['conflict']
+        }
+        # an upsert is an edit: bump the version and ETag validators too
+        values['version'] = table.c.version + 1
+        values['updated_at'] = statement.excluded.updated_at
+        statement = statement.on_conflict_do_update(
+            index_elements=[entity['conflict']], set_=values)
+    else:
+        # shows violating the no-overlap exclusion constraints are skipped
+        statement = statement.on_conflict_do_nothing()
+    result = db.session.execute(statement)
+    if entity['model'] is Show:
+        refresh_show_stats(
+            venue_ids=list({row['venue_id'] for row in rows}))
+    db.session.commit()
+    return 0 if entity['conflict'] else len(rows) - result.rowcount
+
+
+def missing_references(rows):
+    # the venue and artist ids a batch of shows names that do not exist,
+    # per column, looked up with one query each
+    missing = {}
+    for column, model in (('venue_id', Venue), ('artist_id', Artist)):
+        ids = {row[column] for row in rows}
+        found = db.session.execute(
+            db.select(model.id).where(model.id.in_(ids))).scalars()
+        missing[column] = ids - set(found)
+    return missing
+
+
+def load_records(entity, records):
+    # records are (record number, row) pairs. Shows naming a venue or artist
+    # that does not exist are reported and left out, instead of failing the
+    # batch's INSERT on its foreign key. Returns how many rows were loaded,
+    # rejected and skipped for overlapping
+    missing = {}
+    if entity['model'] is Show:
+        missing = missing_references([row for _, row in records])
+    rows = []
+    rejected = 0
+    for number, row in records:
+        unknown = [
+            '{} {}'.format(column, row[column])
+            for column, ids in missing.items() if row[column] in ids]
+        if unknown:
+            rejected += 1
+            click.echo('record {}: unknown {}'.format(
+                number, ', '.join(unknown)), err=True)
+            continue
+        rows.append(row)
+    if not rows:
+        return 0, rejected, 0
+
+    try:
+        overlapping = load_batch(entity, rows)
+    except IntegrityError as error:
+        # e.g. a venue deleted since the check: earlier batches are kept
+        db.session.rollback()
+        raise click.ClickException(
+            'records {} to {} were not loaded: {}'.format(
+                records[0][0], records[-1][0], error.orig))
+    return len(rows) - overlapping, rejected, overlapping
+
+
+@fyyur_cli.command('import')
+@click.argument('entity', type=click.Choice(sorted(ENTITIES)))
+@click.argument('source', type=click.File('r'), default='-')
+@click.option('--format', 'format', type=click.Choice(['jsonl', 'csv']),
+              default='jsonl')
+@click.option('--batch-size', default=1000, show_default=True)
+def import_command(entity, source, format, batch_size):
+    """Validate and load venues, artists or shows from CSV/JSONL.
+
+    Venues and artists are upserted on name, and venues are geocoded.
+    Invalid records and shows naming an unknown venue or artist are
+    reported and skipped, as are shows overlapping one already booked.
+    Exits with status 1 if any record was rejected.
+    """
+    entity = ENTITIES[entity]
+    progress = Progress('imported')
+    batch = []
+    rejected = 0
+    overlapping = 0
+    unlocated = 0
+
+    for number, record in enumerate(read_records(source, format), 1):
+        form = entity['form'](record, meta={'csrf': False})
+        if not form.validate():
+            rejected += 1
+            click.echo('record {}: {}'.format(number, form.errors), err=True)
+            continue
+        row = {field: getattr(form, field).data for field in entity['fields']}
+        try:
+            for field, coerce in entity.get('coerce', {}).items():
+                row[field] = coerce(row[field])
+        except (TypeError, ValueError) as error:
+            rejected += 1
+            click.echo('record {}: {}'.format(number, error), err=True)
+            continue
+        if entity['model'] is Venue:
+            # as create_venue_submission does
+            row['latitude'], row['longitude'] = geocoding.locate(
+                row['address'], row['city'], row['state'])
+            unlocated += row['latitude'] is None
+        batch.append((number, row))
+        if len(batch) >= batch_size:
+            loaded, invalid, skipped = load_records(entity, batch)
+            rejected += invalid
+            overlapping += skipped
+            progress.add(loaded)
+            batch = []
+
+    if batch:
+        loaded, invalid, skipped = load_records(entity, batch)
+        rejected += invalid
+        overlapping += skipped
+        progress.add(loaded)
+    click.echo('{} rows loaded, {} rejected, {} overlapping'.format(
+        progress.rows, rejected, overlapping), err=True)
+    if unlocated:
+        click.echo('{} venues could not be located'.format(unlocated),
+                   err=True)
+    if rejected:
+        raise click.exceptions.Exit(1)
+
+
+#----------------------------------------------------------------------------#
+# Export.
+#----------------------------------------------------------------------------#
+
+def export_value(value, format):
+    if isinstance(value, datetime):
+        return value.strftime(DATETIME_FORMAT)
+    if format == 'csv' and isinstance(value, list):
+        return ','.join(value)
+    return value
+
+
+@fyyur_cli.command('export')
+@click.argument('entity', type=click.Choice(sorted(ENTITIES)))
+@click.argument('target', type=click.File('w'), default='-')
+@click.option('--format', 'format', type=click.Choice(['jsonl', 'csv']),
+              default='jsonl')
+@click.option('--batch-size', default=1000, show_default=True)
+def export_command(entity, target, format, batch_size):
+    """Stream venues, artists or shows out as CSV/JSONL.
+
+    Rows are fetched batch by batch through a server-side cursor, and the
+    output can be fed back to 'flask fyyur import'.
+    """
+    entity = ENTITIES[entity]
+    model = entity['model']
+    fields = ('id',) + entity['fields']
+    query = db.session.query(
+        *[getattr(model, field) for field in fields]).order_by(model.id)
+
+    writer = None
+    if format == 'csv':
+        writer = csv.writer(target)
+        writer.writerow(fields)
+
+    progress = Progress('exported')
+    rows = 0
+    for row in query.yield_per(batch_size):
+        values = [export_value(value, format) for value in row]
+        if writer is not None:
+            writer.writerow(values)
+        else:
+            target.write(json.dumps(dict(zip(fields, values))) + '\n')
+        rows += 1
+        if rows == batch_size:
+            progress.add(rows)
+            rows = 0
+    progress.add(rows)
+
+
+#----------------------------------------------------------------------------#
+# Synthetic data.
+#----------------------------------------------------------------------------#
+
+@fyyur_cli.command('generate')
+@click.option('--venues', default=1000, show_default=True)
+@click.option('--artists', default=2000, show_default=True)
+@click.option('--shows', default=20000, show_default=True)
+@click.option('--seed', default=0, show_default=True)
+def generate_command(venues, artists, shows, seed):
+    """Fill empty tables with a reproducible synthetic dataset.
+
+    Cities, genres and show times follow weighted distributions; the same
+    options and seed always produce the same rows.
+    """
+    started = time.perf_counter()
+    generate(venues, artists, shows, seed)
+    click.echo('generated in {:.2f}s'.format(
+        time.perf_counter() - started), err=True)
+
+
+#----------------------------------------------------------------------------#
+# Statistics.
+#----------------------------------------------------------------------------#
+
+@fyyur_cli.command('refresh-stats')
+def refresh_stats_command():
+    """Recompute the materialized show counts of every venue.
+
+    Shows are counted as they are added, but only a refresh moves them from
+    upcoming to past once they start: run this on a schedule (e.g. every
+    few minutes from cron).
+    """
+    started = time.perf_counter()
+    refresh_show_stats()
+    db.session.commit()
+    click.echo('show stats refreshed in {:.2f}s'.format(
+        time.perf_counter() - started), err=True)
+
+
+#----------------------------------------------------------------------------#
+# Geocoding.
+#----------------------------------------------------------------------------#
+
+@fyyur_cli.command('geocode')
+@click.option('--all', 'everything', is_flag=True,
+              help='Also venues that already have coordinates.')
+@click.option('--batch-size', default=1000, show_default=True)
+def geocode_command(everything, batch_size):
+    """Fill in venue coordinates with the configured GEOCODER.
+
+    Only venues without coordinates unless --all is given. Web workers see
+    them on their next /venues/nearby index rebuild.
+    """
+    table = Venue.__table__
+    statement = table.update().where(
+        table.c.id == bindparam('row_id')).values(
+        latitude=bindparam('latitude'), longitude=bindparam('longitude'))
+    progress = Progress('geocode')
+    unknown = 0
+    after = 0
+    while True:
+        query = db.select(
+            Venue.id, Venue.address, Venue.city, Venue.state).where(
+            Venue.id > after).order_by(Venue.id).limit(batch_size)
+        if not everything:
+            query = query.where(Venue.latitude.is_(None))
+        rows = db.session.execute(query).all()
+        if not rows:
+            break
+        after = rows[-1].id
+        located = []
+        for row in rows:
+            latitude, longitude = geocoding.locate(
+                row.address, row.city, row.state)
+            if latitude is None:
+                unknown += 1
+                continue
+            located.append({
+                'row_id': row.id, 'latitude': latitude,
+                'longitude': longitude})
+        if located:
+            db.session.execute(statement, located)
+        db.session.commit()
+        progress.add(len(rows))
+    if unknown:
+        click.echo('{} venues could not be located'.format(unknown), err=True)
+
+
+#----------------------------------------------------------------------------#
+# Jobs.
+#----------------------------------------------------------------------------#
+
+@fyyur_cli.command('worker')
+def worker_command():
+    """Run background jobs queued in Redis (JOBS_BACKEND = 'redis').
+
+    Start as many as needed; each takes one job at a time.
+    """
+    if not isinstance(jobs.backend, RedisBackend):
+        raise click.UsageError(
+            "JOBS_BACKEND is not 'redis': jobs run inside the web workers")
+    click.echo('waiting for jobs, {} queued'.format(jobs.depth()), err=True)
+    jobs.work()
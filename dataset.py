@@ -0,0 +1,236 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+import random
+from datetime import datetime, timedelta
+from itertools import accumulate
+
+from sqlalchemy.dialects.postgresql import insert
+
+from forms import GENRES, normalize_genres
+from geocode import CITY_LOCATIONS
+from models import db, Venue, Artist, Show
+from stats import refresh_show_stats
+
+#----------------------------------------------------------------------------#
+# Distributions.
+#----------------------------------------------------------------------------#
+
+# (city, state, weight): a few large markets and a long tail
+CITIES = (
+    ('New York', 'NY', 30), ('Los Angeles', 'CA', 24), ('Chicago', 'IL', 16),
+    ('San Francisco', 'CA', 12), ('Austin', 'TX', 10), ('Nashville', 'TN', 10),
+    ('Seattle', 'WA', 8), ('Atlanta', 'GA', 7), ('New Orleans', 'LA', 7),
+    ('Denver', 'CO', 6), ('Boston', 'MA', 6), ('Portland', 'OR', 5),
+    ('Philadelphia', 'PA', 5), ('Detroit', 'MI', 4), ('Minneapolis', 'MN', 4),
+    ('Miami', 'FL', 4), ('Phoenix', 'AZ', 3), ('Kansas City', 'MO', 3),
+    ('Memphis', 'TN', 3), ('Salt Lake City', 'UT', 2), ('Omaha', 'NE', 2),
+    ('Boise', 'ID', 1), ('Burlington', 'VT', 1), ('Anchorage', 'AK', 1),
+)
+
+# popular genres first, the rest of the vocabulary decays
+GENRE_WEIGHTS = [1.0 / (rank + 1) for rank in range(len(GENRES))]
+
+VENUE_WORDS = ('Hall', 'Room', 'Club', 'Lounge', 'Theatre', 'Garden',
+               'Ballroom', 'Cellar', 'Stage', 'Tavern')
+ARTIST_WORDS = ('Band', 'Trio', 'Quartet', 'Collective', 'Ensemble',
+                'Project', 'Orchestra', 'Sound', 'Crew', 'Experience')
+
+# shows start in the evening, more of them at weekends
+START_HOURS = (18, 19, 20, 21, 22)
+START_HOUR_WEIGHTS = (1, 3, 4, 3, 1)
+WEEKDAY_WEIGHTS = (2, 2, 3, 4, 8, 9, 5)
+DURATIONS = (60, 90, 120, 180)
+DURATION_WEIGHTS = (2, 3, 4, 1)
+
+#----------------------------------------------------------------------------#
+# Generator.
+#----------------------------------------------------------------------------#
+
+
+def pick_genres(rng):
+    return normalize_genres(
+        rng.choices(GENRES, GENRE_WEIGHTS, k=rng.randint(1, 3)))
+
+
+def venue_rows(rng, count):
+    cities = rng.choices(CITIES, [city[2] for city in CITIES], k=count)
+    for i, (city, state, _) in enumerate(cities, 1):
+        latitude, longitude = CITY_LOCATIONS[city, state]
+        yield {
+            'name': 'The {} {} {}'.format(city, rng.choice(VENUE_WORDS), i),
+            'city': city,
+            'state': state,
+            'address': '{} Main Street'.format(rng.randint(1, 9999)),
+            # scattered up to about 10 km around the city centre
+            'latitude': latitude + rng.uniform(-0.09, 0.09),
+            'longitude': longitude + rng.uniform(-0.09, 0.09),
+            'phone': '{:03}-{:03}-{:04}'.format(
+                rng.randint(200, 999), rng.randint(0, 999),
+                rng.randint(0, 9999)),
+            'genres': pick_genres(rng),
+            'facebook_link': 'https://www.facebook.com/venue{}'.format(i),
+            'seeking_talent': rng.random() < 0.3,
+        }
+
+
+def artist_rows(rng, count):
+    cities = rng.choices(CITIES, [city[2] for city in CITIES], k=count)
+    for i, (city, state, _) in enumerate(cities, 1):
+        genres = pick_genres(rng)
+        yield {
+            'name': 'The {} {} {}'.format(
+                genres[0], rng.choice(ARTIST_WORDS), i),
+            'city': city,
+            'state': state,
+            'phone': '{:03}-{:03}-{:04}'.format(
+                rng.randint(200, 999), rng.randint(0, 999),
+                rng.randint(0, 9999)),
+            'genres': genres,
+            'facebook_link': 'https://www.facebook.com/artist{}'.format(i),
+            'seeking_venue': rng.random() < 0.3,
+        }
+
+
+def show_rows(rng, count, venue_ids, artist_ids, days, today):
+    # one show per venue per evening and per artist per evening, so the
+    # no-overlap constraints always hold; busy venues and artists (the
+    # first ids) get more shows, and days are drawn from the weekday weights.
+    # Stops early if that leaves no free evening
+    first = today - timedelta(days=days // 2)
+    # cumulative weights, so each draw is a bisect instead of a sum
+    days_cum = list(accumulate(
+        WEEKDAY_WEIGHTS[(first + timedelta(days=day)).weekday()]
+        for day in range(days)))
+    venues_cum = list(accumulate(
+        1.0 / (rank + 10) for rank in range(len(venue_ids))))
+    artists_cum = list(accumulate(
+        1.0 / (rank + 10) for rank in range(len(artist_ids))))
+    booked_venues = set()
+    booked_artists = set()
+    attempts = 0
+    made = 0
+    while made < count and attempts < count * 20:
+        attempts += 1
+        day = rng.choices(range(days), cum_weights=days_cum)[0]
+        venue_id = rng.choices(venue_ids, cum_weights=venues_cum)[0]
+        artist_id = rng.choices(artist_ids, cum_weights=artists_cum)[0]
+        if (venue_id, day) in booked_venues or \
+                (artist_id, day) in booked_artists:
+            continue
+        booked_venues.add((venue_id, day))
+        booked_artists.add((artist_id, day))
+        made += 1
+        start = datetime.combine(first + timedelta(days=day), datetime.min.time())
+        yield {
+            'venue_id': venue_id,
+            'artist_id': artist_id,
+            'start_time': start.replace(hour=rng.choices(
+                START_HOURS, START_HOUR_WEIGHTS)[0]),
+            'duration': rng.choices(DURATIONS, DURATION_WEIGHTS)[0],
+        }
+
+
+def batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def insert_rows(model, rows, batch_size):
+    # multi-row INSERTs, returning the new ids in order
+    ids = []
+    table = model.__table__
+    for batch in batched(rows, batch_size):
+        ids.extend(db.session.execute(
+            insert(table).values(batch).returning(table.c.id)).scalars())
+    return ids
+
+
+def generate(venues, artists, shows, seed=0, days=730, today=None,
+             batch_size=1000):
+    # adds a dataset that only depends on the arguments, with shows spread
+    # over days centred on today. Names are numbered from 1, so generate
+    # into empty tables to keep them unique
+    rng = random.Random(seed)
+    today = today or datetime.now().date()
+    venue_ids = insert_rows(Venue, venue_rows(rng, venues), batch_size)
+    artist_ids = insert_rows(Artist, artist_rows(rng, artists), batch_size)
+    insert_rows(Show, show_rows(
+        rng, shows, venue_ids, artist_ids, days, today), batch_size)
+    refresh_show_stats()
+    db.session.commit()
+
+
+#----------------------------------------------------------------------------#
+# Requests.
+#----------------------------------------------------------------------------#
+
+# (method, path, form data, statement budget) for every page, search, JSON
+# and API route, and booking a show. The other write routes are left out:
+# repeating them would change the dataset under the later requests. Ids
+# and form values are filled in from busiest(); the budgets hold with the
+# page cache disabled, so they include the ETag validator queries
+ROUTES = (
+    ('GET', '/', None, 0),
+    ('GET', '/venues', None, 2),
+    ('GET', '/artists', None, 2),
+    ('GET', '/venues?genre=Jazz&city=Chicago', None, 2),
+    ('GET', '/artists?genre=Jazz&city=Chicago', None, 2),
+    ('GET', '/shows', None, 2),
+    ('GET', '/venues/{venue_id}', None, 3),
+    ('GET', '/artists/{artist_id}', None, 3),
+    ('GET', '/venues/{venue_id}/edit', None, 1),
+    ('GET', '/artists/{artist_id}/edit', None, 1),
+    ('POST', '/venues/search', {'search_term': 'hall'}, 1),
+    ('POST', '/artists/search', {'search_term': 'jazz'}, 1),
+    # the first lookup builds the worker's index
+    ('GET', '/suggest?q=the', None, 2),
+    ('GET', '/venues/nearby?lat=41.88&lng=-87.63', None, 2),
+    ('GET', '/venues/create', None, 0),
+    ('GET', '/artists/create', None, 0),
+    ('GET', '/shows/create', None, 0),
+    ('POST', '/shows/create', {
+        'venue_id': '{venue_id}', 'artist_id': '{artist_id}',
+        'start_time': '2099-01-01 20:00:00', 'duration': 60}, 1),
+    ('GET', '/api/v1/venues', None, 1),
+    ('GET', '/api/v1/artists', None, 1),
+    ('GET', '/api/v1/shows', None, 1),
+    ('GET', '/api/v1/venues/{venue_id}', None, 1),
+    ('GET', '/api/v1/artists/{artist_id}', None, 1),
+    ('GET', '/api/v1/venues/{venue_id}/free-slots', None, 2),
+    ('GET', '/cache/stats', None, 0),
+    ('GET', '/metrics', None, 0),
+)
+
+
+def most_shows(model, column):
+    return db.session.query(column).group_by(column).order_by(
+        db.func.count(Show.id).desc()).limit(1).scalar() or \
+        db.session.query(db.func.min(model.id)).scalar()
+
+
+def busiest():
+    # ids of the venue and artist with most shows, the heaviest detail
+    # pages, as ROUTES fills them in
+    return {
+        'venue_id': most_shows(Venue, Show.venue_id),
+        'artist_id': most_shows(Artist, Show.artist_id),
+    }
+
+
+def request_for(route, values):
+    # (method, path, form data) of a ROUTES entry with values filled in
+    method, path, data = route[:3]
+    if data is not None:
+        data = {
+            name: value.format(**values) if isinstance(value, str) else value
+            for name, value in data.items()
+        }
+    return method, path.format(**values), data
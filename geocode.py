@@ -0,0 +1,131 @@
+import csv
+
+from werkzeug.utils import import_string
+
+
+#----------------------------------------------------------------------------#
+# Geocoders.
+#----------------------------------------------------------------------------#
+
+# (city, state): (latitude, longitude) of the city centre
+CITY_LOCATIONS = {
+    ('Albuquerque', 'NM'): (35.0844, -106.6504),
+    ('Anchorage', 'AK'): (61.2181, -149.9003),
+    ('Atlanta', 'GA'): (33.7490, -84.3880),
+    ('Austin', 'TX'): (30.2672, -97.7431),
+    ('Baltimore', 'MD'): (39.2904, -76.6122),
+    ('Boise', 'ID'): (43.6150, -116.2023),
+    ('Boston', 'MA'): (42.3601, -71.0589),
+    ('Brooklyn', 'NY'): (40.6782, -73.9442),
+    ('Burlington', 'VT'): (44.4759, -73.2121),
+    ('Charlotte', 'NC'): (35.2271, -80.8431),
+    ('Chicago', 'IL'): (41.8781, -87.6298),
+    ('Cincinnati', 'OH'): (39.1031, -84.5120),
+    ('Cleveland', 'OH'): (41.4993, -81.6944),
+    ('Columbus', 'OH'): (39.9612, -82.9988),
+    ('Dallas', 'TX'): (32.7767, -96.7970),
+    ('Denver', 'CO'): (39.7392, -104.9903),
+    ('Detroit', 'MI'): (42.3314, -83.0458),
+    ('Honolulu', 'HI'): (21.3069, -157.8583),
+    ('Houston', 'TX'): (29.7604, -95.3698),
+    ('Indianapolis', 'IN'): (39.7684, -86.1581),
+    ('Kansas City', 'MO'): (39.0997, -94.5786),
+    ('Las Vegas', 'NV'): (36.1699, -115.1398),
+    ('Los Angeles', 'CA'): (34.0522, -118.2437),
+    ('Memphis', 'TN'): (35.1495, -90.0490),
+    ('Miami', 'FL'): (25.7617, -80.1918),
+    ('Milwaukee', 'WI'): (43.0389, -87.9065),
+    ('Minneapolis', 'MN'): (44.9778, -93.2650),
+    ('Nashville', 'TN'): (36.1627, -86.7816),
+    ('New Orleans', 'LA'): (29.9511, -90.0715),
+    ('New York', 'NY'): (40.7128, -74.0060),
+    ('Oakland', 'CA'): (37.8044, -122.2712),
+    ('Omaha', 'NE'): (41.2565, -95.9345),
+    ('Orlando', 'FL'): (28.5383, -81.3792),
+    ('Philadelphia', 'PA'): (39.9526, -75.1652),
+    ('Phoenix', 'AZ'): (33.4484, -112.0740),
+    ('Pittsburgh', 'PA'): (40.4406, -79.9959),
+    ('Portland', 'OR'): (45.5152, -122.6784),
+    ('Raleigh', 'NC'): (35.7796, -78.6382),
+    ('Sacramento', 'CA'): (38.5816, -121.4944),
+    ('Salt Lake City', 'UT'): (40.7608, -111.8910),
+    ('San Diego', 'CA'): (32.7157, -117.1611),
+    ('San Francisco', 'CA'): (37.7749, -122.4194),
+    ('San Jose', 'CA'): (37.3382, -121.8863),
+    ('Seattle', 'WA'): (47.6062, -122.3321),
+    ('St. Louis', 'MO'): (38.6270, -90.1994),
+    ('Tampa', 'FL'): (27.9506, -82.4572),
+    ('Tucson', 'AZ'): (32.2226, -110.9747),
+    ('Washington', 'DC'): (38.9072, -77.0369),
+}
+
+
+def city_key(city, state):
+    return (' '.join((city or '').split()).casefold(),
+            (state or '').strip().upper())
+
+
+class CityGeocoder(object):
+    # offline: the centre of the venue's city, from CITY_LOCATIONS plus an
+    # optional CSV of city,state,latitude,longitude rows (GEOCODER_TABLE).
+    # The street address is ignored, so venues in one city share a point
+
+    def __init__(self, config):
+        self.locations = {
+            city_key(city, state): location
+            for (city, state), location in CITY_LOCATIONS.items()
+        }
+        table = config.get('GEOCODER_TABLE')
+        if table:
+            with open(table, newline='') as table_file:
+                for row in csv.DictReader(table_file):
+                    self.locations[city_key(row['city'], row['state'])] = (
+                        float(row['latitude']), float(row['longitude']))
+
+    def locate(self, address, city, state):
+        return self.locations.get(city_key(city, state))
+
+
+class NullGeocoder(object):
+
+    def __init__(self, config):
+        pass
+
+    def locate(self, address, city, state):
+        return None
+
+
+GEOCODERS = {
+    'cities': CityGeocoder,
+    None: NullGeocoder,
+}
+
+
+#----------------------------------------------------------------------------#
+# Geocoding.
+#----------------------------------------------------------------------------#
+
+class Geocoding(object):
+    # venue coordinates for /venues/nearby. GEOCODER names one of
+    # GEOCODERS, or the import path of any class taking the app config
+    # with a locate(address, city, state) method returning (latitude,
+    # longitude) or None, e.g. one backed by a local Nominatim
+
+    def __init__(self, app=None):
+        self.backend = NullGeocoder({})
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        name = app.config.get('GEOCODER')
+        geocoder = GEOCODERS[name] if name in GEOCODERS else \
+            import_string(name)
+        self.backend = geocoder(app.config)
+        app.extensions['geocoding'] = self
+
+    def locate(self, address, city, state):
+        # (latitude, longitude), or (None, None) when unknown
+        return self.backend.locate(address, city, state) or (None, None)
+
+
+geocoding = Geocoding()
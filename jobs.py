@@ -0,0 +1,220 @@
+import atexit
+import logging
+import os
+import pickle
+import queue
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from models import db
+
+logger = logging.getLogger(__name__)
+
+
+#----------------------------------------------------------------------------#
+# Backends.
+#----------------------------------------------------------------------------#
+
+def run_inline(run, job):
+    # blocks the caller, but on a thread of its own: db.session is scoped
+    # per thread, and the caller's is mid-commit when after_commit hooks run
+    thread = threading.Thread(target=run, args=(job,))
+    thread.start()
+    thread.join()
+
+
+class ThreadBackend(object):
+    # a bounded in-process queue drained by a pool of daemon threads.
+    # Threads start on the first job in each process, so they survive
+    # gunicorn --preload forking the app; queued jobs get up to
+    # timeout seconds to finish when the process exits
+
+    def __init__(self, run, workers=4, max_queue=1000):
+        self.run = run
+        self.workers = workers
+        self.queue = queue.Queue(max_queue)
+        self.threads = []
+        self.pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self.pid == os.getpid():
+                return
+            self.pid = os.getpid()
+            self.threads = [
+                threading.Thread(target=self.work,
+                                 name='fyyur-job-{}'.format(i), daemon=True)
+                for i in range(self.workers)
+            ]
+            for thread in self.threads:
+                thread.start()
+            atexit.register(self.shutdown)
+
+    def put(self, job):
+        # False when the queue is full
+        if self.pid != os.getpid():
+            self.start()
+        try:
+            self.queue.put_nowait(job)
+            return True
+        except queue.Full:
+            return False
+
+    def work(self):
+        while True:
+            job = self.queue.get()
+            try:
+                if job is None:
+                    return
+                self.run(job)
+            finally:
+                self.queue.task_done()
+
+    def depth(self):
+        return self.queue.qsize()
+
+    def shutdown(self, timeout=10):
+        deadline = time.monotonic() + timeout
+        try:
+            for _ in self.threads:
+                self.queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        for thread in self.threads:
+            thread.join(max(0, deadline - time.monotonic()))
+
+
+class RedisBackend(object):
+    # a list on any Redis-compatible server, drained by separate
+    # 'flask fyyur worker' processes, so jobs survive a web worker restart
+
+    def __init__(self, run, url, key='fyyur:jobs', max_queue=1000):
+        # optional dependency, only needed with JOBS_BACKEND = 'redis'
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.run = run
+        self.key = key
+        self.max_queue = max_queue
+
+    def put(self, job):
+        if self.client.llen(self.key) >= self.max_queue:
+            return False
+        self.client.lpush(self.key, pickle.dumps(job))
+        return True
+
+    def work(self):
+        while True:
+            _, job = self.client.brpop(self.key)
+            self.run(pickle.loads(job))
+
+    def depth(self):
+        return self.client.llen(self.key)
+
+
+class SyncBackend(object):
+    # runs each job before returning to the caller, e.g. for scripts and
+    # debugging
+
+    def __init__(self, run):
+        self.run = run
+
+    def put(self, job):
+        run_inline(self.run, job)
+        return True
+
+    def depth(self):
+        return 0
+
+
+#----------------------------------------------------------------------------#
+# Queue.
+#----------------------------------------------------------------------------#
+
+class JobQueue(object):
+    # background jobs for follow-up work a request should not wait for.
+    # Jobs are functions registered with @jobs.task and referred to by
+    # name, so the Redis backend can hand them to another process; each
+    # runs in an app context and is retried with exponential backoff
+
+    def __init__(self, app=None):
+        self.tasks = {}
+        self.backend = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.retries = app.config.get('JOBS_RETRIES', 3)
+        self.backoff = app.config.get('JOBS_BACKOFF', 0.5)
+        backend = app.config.get('JOBS_BACKEND')
+        max_queue = app.config.get('JOBS_MAX_QUEUE', 1000)
+        if backend == 'thread':
+            self.backend = ThreadBackend(
+                self.run, app.config.get('JOBS_WORKERS', 4), max_queue)
+        elif backend == 'redis':
+            self.backend = RedisBackend(
+                self.run, app.config['JOBS_REDIS_URL'],
+                app.config.get('JOBS_REDIS_KEY', 'fyyur:jobs'), max_queue)
+        else:
+            self.backend = SyncBackend(self.run)
+        app.extensions['jobs'] = self
+
+    def task(self, function):
+        self.tasks[function.__name__] = function
+        return function
+
+    def enqueue(self, task, *args, **kwargs):
+        job = (task.__name__, args, kwargs)
+        if not self.backend.put(job):
+            # queue full: the caller does the work itself, which slows the
+            # producers down instead of growing the queue without bound
+            logger.warning('job queue full, running %s inline', job[0])
+            run_inline(self.run, job)
+
+    def after_commit(self, task, *args, **kwargs):
+        # enqueue once the current transaction commits; dropped if it
+        # rolls back instead
+        db.session.info.setdefault('after_commit', []).append(
+            (task, args, kwargs))
+
+    def run(self, job):
+        name, args, kwargs = job
+        for attempt in range(self.retries + 1):
+            try:
+                with self.app.app_context():
+                    self.tasks[name](*args, **kwargs)
+                return
+            except Exception:
+                if attempt == self.retries:
+                    logger.exception('job %s failed, giving up', name)
+                    return
+                delay = self.backoff * 2 ** attempt
+                logger.warning(
+                    'job %s failed, retrying in %.1fs', name, delay,
+                    exc_info=True)
+                time.sleep(delay)
+
+    def work(self):
+        # blocks draining the queue, see 'flask fyyur worker'
+        self.backend.work()
+
+    def depth(self):
+        return self.backend.depth()
+
+
+jobs = JobQueue()
+
+
+@event.listens_for(Session, 'after_commit')
+def enqueue_after_commit(session):
+    for task, args, kwargs in session.info.pop('after_commit', ()):
+        jobs.enqueue(task, *args, **kwargs)
+
+
+@event.listens_for(Session, 'after_rollback')
+def discard_after_commit(session):
+    session.info.pop('after_commit', None)
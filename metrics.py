@@ -0,0 +1,296 @@
+import re
+import threading
+import time
+from collections import Counter as Tally, defaultdict
+
+from flask import current_app, g, has_app_context, has_request_context, \
+    request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+#----------------------------------------------------------------------------#
+# Instruments.
+#----------------------------------------------------------------------------#
+
+def format_labels(names, values):
+    return ','.join(
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace(
+            '"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values))
+
+
+class Counter(object):
+
+    def __init__(self, name, help, labels):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.values = defaultdict(float)
+        self._lock = threading.Lock()
+
+    def inc(self, labels, amount=1):
+        with self._lock:
+            self.values[labels] += amount
+
+    def exposition(self):
+        yield '# HELP {} {}'.format(self.name, self.help)
+        yield '# TYPE {} counter'.format(self.name)
+        with self._lock:
+            values = sorted(self.values.items())
+        for labels, value in values:
+            yield '{}{{{}}} {}'.format(
+                self.name, format_labels(self.labels, labels), value)
+
+
+class Histogram(object):
+    # cumulative buckets as Prometheus expects them, per label set
+
+    def __init__(self, name, help, labels, buckets):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self.values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels, value):
+        with self._lock:
+            counts, total = self.values.get(
+                labels, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self.values[labels] = (counts, total + value)
+
+    def exposition(self):
+        yield '# HELP {} {}'.format(self.name, self.help)
+        yield '# TYPE {} histogram'.format(self.name)
+        with self._lock:
+            values = sorted(
+                (labels, (list(counts), total))
+                for labels, (counts, total) in self.values.items())
+        for labels, (counts, total) in values:
+            names = format_labels(self.labels, labels)
+            for bound, count in zip(self.buckets, counts):
+                yield '{}_bucket{{{},le="{}"}} {}'.format(
+                    self.name, names,
+                    '+Inf' if bound == float('inf') else bound, count)
+            yield '{}_sum{{{}}} {}'.format(self.name, names, total)
+            yield '{}_count{{{}}} {}'.format(self.name, names, counts[-1])
+
+
+#----------------------------------------------------------------------------#
+# Request metrics.
+#----------------------------------------------------------------------------#
+
+class TimedTemplate(Template):
+    # render() is only called for the top-level template (extends and
+    # include go through the compiled render functions), so nesting is not
+    # counted twice. Flask's template signals would need blinker
+
+    def render(self, *args, **kwargs):
+        if not has_request_context() or 'metrics' not in g:
+            return super().render(*args, **kwargs)
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            g.metrics['templates'] += time.perf_counter() - started
+
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Metrics(object):
+    # per-route latency, SQL and template timings for every request,
+    # exposed in the Prometheus text format by /metrics. Values are kept
+    # per process: scrape each worker, or run a single one behind the
+    # scraper. Requests over METRICS_MAX_QUERIES statements or
+    # METRICS_SLOW_REQUEST_MS are logged, as are statements over
+    # METRICS_SLOW_QUERY_MS
+
+    def __init__(self, app=None):
+        self.requests = Counter(
+            'fyyur_requests_total', 'Requests handled.',
+            ('endpoint', 'method', 'status'))
+        self.slow_requests = Counter(
+            'fyyur_slow_requests_total',
+            'Requests over the query count or duration budget.',
+            ('endpoint', 'budget'))
+        self.duration = Histogram(
+            'fyyur_request_duration_seconds', 'Request latency.',
+            ('endpoint', 'method'), SECONDS)
+        self.queries = Histogram(
+            'fyyur_request_sql_queries', 'SQL statements per request.',
+            ('endpoint',), QUERIES)
+        self.sql_duration = Histogram(
+            'fyyur_request_sql_duration_seconds',
+            'Time spent in SQL per request.', ('endpoint',), SECONDS)
+        self.template_duration = Histogram(
+            'fyyur_request_template_duration_seconds',
+            'Time spent rendering templates per request.',
+            ('endpoint',), SECONDS)
+        self.instruments = (
+            self.requests, self.slow_requests, self.duration, self.queries,
+            self.sql_duration, self.template_duration)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.max_queries = app.config.get('METRICS_MAX_QUERIES', 20)
+        self.slow_request = app.config.get('METRICS_SLOW_REQUEST_MS', 500) / 1000
+        self.slow_query = app.config.get('METRICS_SLOW_QUERY_MS', 100) / 1000
+        app.before_request(self.start_request)
+        app.after_request(self.finish_request)
+        # after configure_templates, before any template is loaded
+        app.jinja_env.template_class = TimedTemplate
+        # every engine, including ones created after this
+        if not event.contains(
+                Engine, 'before_cursor_execute', self.before_execute):
+            event.listen(Engine, 'before_cursor_execute', self.before_execute)
+            event.listen(Engine, 'after_cursor_execute', self.after_execute)
+        app.extensions['metrics'] = self
+
+    def start_request(self):
+        g.metrics = {
+            'started': time.perf_counter(),
+            'queries': 0,
+            'sql': 0.0,
+            'templates': 0.0,
+        }
+
+    def before_execute(self, conn, cursor, statement, parameters, context,
+                       executemany):
+        # kept on the statement's execution context rather than the
+        # connection: a statement that fails never reaches after_execute,
+        # and its context is dropped with it
+        if context is not None:
+            context.metrics_started = time.perf_counter()
+
+    def after_execute(self, conn, cursor, statement, parameters, context,
+                      executemany):
+        started = getattr(context, 'metrics_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        if elapsed > self.slow_query and has_app_context():
+            current_app.logger.warning(
+                'slow query (%.0f ms): %s', elapsed * 1000, statement)
+        # background jobs and CLI commands run outside any request
+        if has_request_context() and 'metrics' in g:
+            g.metrics['queries'] += 1
+            g.metrics['sql'] += elapsed
+
+    def finish_request(self, response):
+        recorded = g.pop('metrics', None)
+        if recorded is None:
+            return response
+        elapsed = time.perf_counter() - recorded['started']
+        endpoint = request.endpoint or 'unmatched'
+
+        self.requests.inc((endpoint, request.method, response.status_code))
+        self.duration.observe((endpoint, request.method), elapsed)
+        self.queries.observe((endpoint,), recorded['queries'])
+        self.sql_duration.observe((endpoint,), recorded['sql'])
+        self.template_duration.observe((endpoint,), recorded['templates'])
+
+        budgets = []
+        if recorded['queries'] > self.max_queries:
+            budgets.append('queries')
+        if elapsed > self.slow_request:
+            budgets.append('duration')
+        for budget in budgets:
+            self.slow_requests.inc((endpoint, budget))
+        if budgets:
+            current_app.logger.warning(
+                'slow request %s %s: %.0f ms, %d queries (%.0f ms), '
+                'templates %.0f ms', request.method, request.full_path,
+                elapsed * 1000, recorded['queries'], recorded['sql'] * 1000,
+                recorded['templates'] * 1000)
+
+        response.headers['Server-Timing'] = \
+            'db;dur={:.1f}, tpl;dur={:.1f}, total;dur={:.1f}'.format(
+                recorded['sql'] * 1000, recorded['templates'] * 1000,
+                elapsed * 1000)
+        return response
+
+    def exposition(self):
+        lines = []
+        for instrument in self.instruments:
+            lines.extend(instrument.exposition())
+        return '\n'.join(lines) + '\n'
+
+
+#----------------------------------------------------------------------------#
+# Query budgets.
+#----------------------------------------------------------------------------#
+
+def fingerprint(statement):
+    # the statement with literals and bind parameters blanked out, so one
+    # query issued in a loop with different values always looks the same
+    statement = re.sub(r"'(?:[^']|'')*'", '?', statement)
+    statement = re.sub(r'%\(\w+\)s|%s|\b\d+\b', '?', statement)
+    statement = re.sub(r'\(\s*\?(?:\s*,\s*\?)*\s*\)', '(?)', statement)
+    return ' '.join(statement.split())
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class QueryCounter(object):
+    # counts the statements the current thread sends through engine while
+    # the block runs, e.g. around a test client request:
+    #
+    #     with QueryCounter(db.engine, budget=3, label='/venues'):
+    #         client.get('/venues')
+    #
+    # and raises QueryBudgetExceeded on exit when there were more than
+    # budget, naming the most repeated statement, usually an N+1 loop
+
+    def __init__(self, engine, budget=None, label='block'):
+        self.engine = engine
+        self.budget = budget
+        self.label = label
+        self.statements = []
+        self.thread = None
+
+    def __enter__(self):
+        self.thread = threading.get_ident()
+        event.listen(self.engine, 'before_cursor_execute', self.record)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        event.remove(self.engine, 'before_cursor_execute', self.record)
+        if exc_type is None and self.budget is not None and \
+                self.count > self.budget:
+            raise QueryBudgetExceeded(self.report())
+
+    def record(self, conn, cursor, statement, parameters, context,
+               executemany):
+        # background jobs run on threads of their own and are not counted
+        if threading.get_ident() == self.thread:
+            self.statements.append(statement)
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+    def repeated(self):
+        # (fingerprint, times) of the statements issued more than once
+        return [
+            (statement, times) for statement, times in Tally(
+                fingerprint(statement)
+                for statement in self.statements).most_common()
+            if times > 1
+        ]
+
+    def report(self):
+        lines = ['{}: {} statements, budget {}'.format(
+            self.label, self.count, self.budget)]
+        for statement, times in self.repeated():
+            lines.append('  x{} {}'.format(times, statement))
+        return '\n'.join(lines)
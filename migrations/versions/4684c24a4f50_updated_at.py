@@ -0,0 +1,32 @@
+"""updated_at on venue, artist and show
+
+Revision ID: 4684c24a4f50
+Revises: f02f77987287
+Create Date: 2026-10-18 11:20:53.871402
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4684c24a4f50'
+down_revision = 'f02f77987287'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('venue', 'artist', 'show'):
+        op.add_column(table, sa.Column(
+            'updated_at', sa.DateTime(), nullable=False,
+            server_default=sa.text("timezone('utc', now())")))
+        # max(updated_at) for the ETag is then a single index probe
+        op.create_index(
+            'ix_{}_updated_at'.format(table), table, ['updated_at'])
+
+
+def downgrade():
+    for table in ('show', 'artist', 'venue'):
+        op.drop_index('ix_{}_updated_at'.format(table), table_name=table)
+        op.drop_column(table, 'updated_at')
@@ -0,0 +1,56 @@
+"""show duration, no overlapping shows per venue or artist
+
+Revision ID: 727cf7392bd7
+Revises: ea9d3e36cf97
+Create Date: 2026-10-18 14:41:05.530918
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '727cf7392bd7'
+down_revision = 'ea9d3e36cf97'
+branch_labels = None
+depends_on = None
+
+# must match models.SHOW_DURING
+DURING = "tsrange(start_time, start_time + duration * interval '1 minute')"
+
+OVERLAPS = """
+SELECT count(*) FROM show a JOIN show b
+  ON a.{column} = b.{column} AND a.id < b.id
+ AND tsrange(a.start_time, a.start_time + a.duration * interval '1 minute') &&
+     tsrange(b.start_time, b.start_time + b.duration * interval '1 minute')
+"""
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS btree_gist')
+    # existing shows get the form's default length
+    op.add_column('show', sa.Column(
+        'duration', sa.Integer(), nullable=False, server_default='120'))
+
+    connection = op.get_bind()
+    for column in ('venue_id', 'artist_id'):
+        overlapping = connection.execute(
+            sa.text(OVERLAPS.format(column=column))).scalar()
+        if overlapping:
+            raise RuntimeError(
+                '{} pairs of shows overlap on {}; reschedule or shorten '
+                'them before upgrading'.format(overlapping, column))
+
+    # each constraint is backed by a GiST index on (id, range), which also
+    # serves the free-slot lookups
+    for column in ('venue_id', 'artist_id'):
+        op.execute(
+            'ALTER TABLE show ADD CONSTRAINT show_{0}_during_excl '
+            'EXCLUDE USING gist ({0} WITH =, {1} WITH &&) '
+            'WHERE (start_time IS NOT NULL)'.format(column, DURING))
+
+
+def downgrade():
+    op.drop_constraint('show_artist_id_during_excl', 'show')
+    op.drop_constraint('show_venue_id_during_excl', 'show')
+    op.drop_column('show', 'duration')
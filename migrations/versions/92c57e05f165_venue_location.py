@@ -0,0 +1,28 @@
+"""venue latitude and longitude for /venues/nearby
+
+Revision ID: 92c57e05f165
+Revises: ca5d2ecd60db
+Create Date: 2026-10-18 16:20:44.918230
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '92c57e05f165'
+down_revision = 'ca5d2ecd60db'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # filled by 'flask fyyur geocode'; the spatial index is the k-d tree in
+    # nearby.py, so no database index
+    op.add_column('venue', sa.Column('latitude', sa.Float(), nullable=True))
+    op.add_column('venue', sa.Column('longitude', sa.Float(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('venue', 'longitude')
+    op.drop_column('venue', 'latitude')
@@ -0,0 +1,57 @@
+"""trigram and full-text search indexes on venue and artist
+
+Revision ID: c08b78d76e67
+Revises: 051de363172a
+Create Date: 2026-10-18 09:12:41.503218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c08b78d76e67'
+down_revision = '051de363172a'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+
+    # name ILIKE '%term%' can use a trigram GIN index instead of a seq scan
+    op.execute(
+        'CREATE INDEX ix_venue_name_trgm ON venue '
+        'USING gin (name gin_trgm_ops)')
+    op.execute(
+        'CREATE INDEX ix_artist_name_trgm ON artist '
+        'USING gin (name gin_trgm_ops)')
+
+    # array_to_string is only STABLE, so wrap the document in an IMMUTABLE
+    # function that can back an expression index
+    op.execute("""
+        CREATE FUNCTION fyyur_search_document(
+            name text, city text, state text, genres text[])
+        RETURNS tsvector AS $$
+            SELECT to_tsvector('simple',
+                coalesce(name, '') || ' ' ||
+                coalesce(city, '') || ' ' ||
+                coalesce(state, '') || ' ' ||
+                coalesce(array_to_string(genres, ' '), ''))
+        $$ LANGUAGE sql IMMUTABLE
+    """)
+    op.execute(
+        'CREATE INDEX ix_venue_search_document ON venue USING gin '
+        '(fyyur_search_document(name, city, state, genres))')
+    op.execute(
+        'CREATE INDEX ix_artist_search_document ON artist USING gin '
+        '(fyyur_search_document(name, city, state, genres))')
+
+
+def downgrade():
+    op.execute('DROP INDEX ix_artist_search_document')
+    op.execute('DROP INDEX ix_venue_search_document')
+    op.execute(
+        'DROP FUNCTION fyyur_search_document(text, text, text, text[])')
+    op.execute('DROP INDEX ix_artist_name_trgm')
+    op.execute('DROP INDEX ix_venue_name_trgm')
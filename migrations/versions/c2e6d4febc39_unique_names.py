@@ -0,0 +1,44 @@
+"""unique venue and artist names, the conflict target for bulk upserts
+
+Revision ID: c2e6d4febc39
+Revises: f7679de27df2
+Create Date: 2026-10-18 12:48:09.402517
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c2e6d4febc39'
+down_revision = 'f7679de27df2'
+branch_labels = None
+depends_on = None
+
+
+def check_duplicates(table):
+    # nothing kept names unique before this revision. Which of two rows
+    # sharing a name (and their shows) should win is not ours to decide,
+    # so stop before changing anything and say which names to fix
+    names = op.get_bind().execute(sa.text(
+        'SELECT name, count(*) FROM {} WHERE name IS NOT NULL '
+        'GROUP BY name HAVING count(*) > 1 ORDER BY name'.format(table)
+    )).fetchall()
+    if names:
+        raise RuntimeError(
+            'duplicate {} names, rename or merge them and upgrade again: '
+            '{}'.format(table, ', '.join(
+                '{!r} ({} rows)'.format(name, count)
+                for name, count in names)))
+
+
+def upgrade():
+    check_duplicates('venue')
+    check_duplicates('artist')
+    op.create_unique_constraint('venue_name_key', 'venue', ['name'])
+    op.create_unique_constraint('artist_name_key', 'artist', ['name'])
+
+
+def downgrade():
+    op.drop_constraint('artist_name_key', 'artist', type_='unique')
+    op.drop_constraint('venue_name_key', 'venue', type_='unique')
@@ -0,0 +1,75 @@
+"""genres normalized to the vocabulary, GIN indexes for the genre filters
+
+Revision ID: ca5d2ecd60db
+Revises: 727cf7392bd7
+Create Date: 2026-10-18 15:32:17.204815
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ca5d2ecd60db'
+down_revision = '727cf7392bd7'
+branch_labels = None
+depends_on = None
+
+# forms.GENRES as of this revision
+GENRES = (
+    'Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk',
+    'Funk', 'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz',
+    'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul',
+    'Other',
+)
+
+# the same rules as forms.normalize_genres: split comma-joined values,
+# match names in any case, anything else becomes 'Other', vocabulary order
+NORMALIZE = """
+WITH vocabulary(genre, position) AS (VALUES {vocabulary}),
+parts AS (
+    SELECT DISTINCT t.id, coalesce(v.genre, 'Other') AS genre,
+           coalesce(v.position, {other}) AS position
+      FROM {table} t
+     CROSS JOIN LATERAL unnest(t.genres) AS raw(value)
+     CROSS JOIN LATERAL regexp_split_to_table(raw.value, ',') AS part(value)
+      LEFT JOIN vocabulary v
+        ON lower(v.genre) = lower(btrim(part.value, ' {{}}"'))
+     WHERE btrim(part.value, ' {{}}"') <> ''
+),
+normalized AS (
+    SELECT id, array_agg(genre ORDER BY position)::varchar[] AS genres
+      FROM parts GROUP BY id
+)
+UPDATE {table} SET genres = normalized.genres
+  FROM normalized
+ WHERE {table}.id = normalized.id
+   AND {table}.genres IS DISTINCT FROM normalized.genres
+"""
+
+
+def upgrade():
+    vocabulary = ', '.join(
+        "('{}', {})".format(genre, position)
+        for position, genre in enumerate(GENRES))
+    for table in ('venue', 'artist'):
+        op.execute(NORMALIZE.format(
+            table=table, vocabulary=vocabulary,
+            other=GENRES.index('Other')))
+
+    # genres @> ARRAY['Jazz'] as a bitmap index scan, ANDed with the city
+    # index when both filters are given
+    op.create_index(
+        'ix_venue_genres', 'venue', ['genres'], postgresql_using='gin')
+    op.create_index(
+        'ix_artist_genres', 'artist', ['genres'], postgresql_using='gin')
+    op.create_index('ix_venue_city', 'venue', ['city'])
+    op.create_index('ix_artist_city', 'artist', ['city'])
+
+
+def downgrade():
+    # the normalized genres stay as they are
+    op.drop_index('ix_artist_city', table_name='artist')
+    op.drop_index('ix_venue_city', table_name='venue')
+    op.drop_index('ix_artist_genres', table_name='artist')
+    op.drop_index('ix_venue_genres', table_name='venue')
@@ -0,0 +1,54 @@
+"""materialized show counts per venue
+
+Revision ID: ea9d3e36cf97
+Revises: c2e6d4febc39
+Create Date: 2026-10-18 14:02:37.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'ea9d3e36cf97'
+down_revision = 'c2e6d4febc39'
+branch_labels = None
+depends_on = None
+
+# start_time is a naive local timestamp, hence LOCALTIMESTAMP; refreshed_at
+# is UTC like updated_at
+BACKFILL = """
+INSERT INTO venue_stats (venue_id, upcoming_shows_count, past_shows_count,
+                         next_show_time, refreshed_at)
+SELECT venue.id,
+       count(show.id) FILTER (WHERE show.start_time >= LOCALTIMESTAMP),
+       count(show.id) FILTER (WHERE show.start_time < LOCALTIMESTAMP),
+       min(show.start_time) FILTER (WHERE show.start_time >= LOCALTIMESTAMP),
+       timezone('utc', now())
+FROM venue LEFT JOIN show ON show.venue_id = venue.id
+GROUP BY venue.id
+"""
+
+
+def upgrade():
+    op.create_table(
+        'venue_stats',
+        sa.Column('venue_id', sa.Integer(), nullable=False),
+        sa.Column('upcoming_shows_count', sa.Integer(), nullable=False,
+                  server_default='0'),
+        sa.Column('past_shows_count', sa.Integer(), nullable=False,
+                  server_default='0'),
+        sa.Column('next_show_time', sa.DateTime(), nullable=True),
+        sa.Column('refreshed_at', sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ['venue_id'], ['venue.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('venue_id'))
+    op.create_index(
+        op.f('ix_venue_stats_refreshed_at'), 'venue_stats', ['refreshed_at'])
+    op.execute(BACKFILL)
+
+
+def downgrade():
+    op.drop_index(
+        op.f('ix_venue_stats_refreshed_at'), table_name='venue_stats')
+    op.drop_table('venue_stats')
@@ -0,0 +1,49 @@
+"""show primary key on id, covering indexes for show lookups
+
+Revision ID: f02f77987287
+Revises: c08b78d76e67
+Create Date: 2026-10-18 10:04:17.226140
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f02f77987287'
+down_revision = 'c08b78d76e67'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # id alone identifies a show; make sure it is backed by a sequence even
+    # on databases created before autoincrement was picked up
+    op.execute('CREATE SEQUENCE IF NOT EXISTS show_id_seq OWNED BY show.id')
+    op.execute(
+        "ALTER TABLE show ALTER COLUMN id SET DEFAULT nextval('show_id_seq')")
+    op.execute(
+        "SELECT setval('show_id_seq', coalesce(max(id), 0) + 1, false) "
+        "FROM show")
+    op.drop_constraint('show_pkey', 'show', type_='primary')
+    op.create_primary_key('show_pkey', 'show', ['id'])
+
+    # past/upcoming filters per venue and per artist, including every show
+    # column so the detail pages and venue counts are index-only
+    op.create_index(
+        'ix_show_venue_id_start_time', 'show', ['venue_id', 'start_time'],
+        postgresql_include=['id', 'artist_id'])
+    op.create_index(
+        'ix_show_artist_id_start_time', 'show', ['artist_id', 'start_time'],
+        postgresql_include=['id', 'venue_id'])
+    # keyset pagination on /shows
+    op.create_index('ix_show_start_time_id', 'show', ['start_time', 'id'])
+
+
+def downgrade():
+    op.drop_index('ix_show_start_time_id', table_name='show')
+    op.drop_index('ix_show_artist_id_start_time', table_name='show')
+    op.drop_index('ix_show_venue_id_start_time', table_name='show')
+    op.drop_constraint('show_pkey', 'show', type_='primary')
+    op.create_primary_key(
+        'show_pkey', 'show', ['id', 'venue_id', 'artist_id'])
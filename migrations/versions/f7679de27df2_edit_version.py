@@ -0,0 +1,34 @@
+"""version column on venue and artist for optimistic concurrency
+
+Revision ID: f7679de27df2
+Revises: 4684c24a4f50
+Create Date: 2026-10-18 12:02:36.118920
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7679de27df2'
+down_revision = '4684c24a4f50'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('venue', 'artist'):
+        op.add_column(table, sa.Column(
+            'version', sa.Integer(), nullable=False, server_default='1'))
+
+    # earlier edits stored genres as one comma-joined element
+    for table in ('venue', 'artist'):
+        op.execute(
+            "UPDATE {0} SET genres = string_to_array(genres[1], ', ') "
+            "WHERE array_length(genres, 1) = 1 "
+            "AND genres[1] LIKE '%, %'".format(table))
+
+
+def downgrade():
+    for table in ('artist', 'venue'):
+        op.drop_column(table, 'version')
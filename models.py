@@ -0,0 +1,275 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from datetime import datetime
+from sqlalchemy.dialects.postgresql import ARRAY, ExcludeConstraint
+import config
+from replicas import RoutingSQLAlchemy
+
+# reads during GET requests may go to a replica, see replicas.py
+db = RoutingSQLAlchemy()
+
+#----------------------------------------------------------------------------#
+# Models.
+#----------------------------------------------------------------------------#
+
+
+class Venue(db.Model):
+    __tablename__ = 'venue'
+    __table_args__ = (
+        # ?genre=&city= filters on /venues, see ca5d2ecd60db
+        db.Index('ix_venue_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_venue_city', 'city'),
+        # name ILIKE '%term%' and the search boxes, see c08b78d76e67
+        db.Index(
+            'ix_venue_name_trgm', 'name', postgresql_using='gin',
+            postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index(
+            'ix_venue_search_document',
+            db.text('fyyur_search_document(name, city, state, genres)'),
+            postgresql_using='gin'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, unique=True)
+    city = db.Column(db.String(120))
+    state = db.Column(db.String(120))
+    address = db.Column(db.String(120))
+    # degrees, filled by the geocoder (geocode.py); NULL until geocoded
+    latitude = db.Column(db.Float)
+    longitude = db.Column(db.Float)
+    phone = db.Column(db.String(120))
+    image_link = db.Column(db.String(500))
+    facebook_link = db.Column(db.String(120))
+    #added - DONE
+    # vocabulary names only, see forms.normalize_genres
+    genres = db.Column(ARRAY(db.String))
+    website = db.Column(db.String(120))
+    seeking_talent = db.Column(db.Boolean)
+    seeking_description = db.Column(db.String(500))
+    # bumped by every edit, see update_from_form in app.py
+    version = db.Column(
+        db.Integer, nullable=False, default=1, server_default='1')
+    updated_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+        index=True,
+        server_default=db.text("timezone('utc', now())"))
+    # loading strategy ('select', 'selectin', 'joined', ...) is configurable
+    show = db.relationship(
+        "Show",
+        back_populates="venue",
+        lazy=config.VENUE_SHOWS_LOADING)
+
+    # TODO: implement any missing fields, as a database migration using
+    # Flask-Migrate - DONE
+    def venue_to_dictionary(self):
+        return{
+            'id': self.id,
+            'name': self.name,
+            'city': self.city,
+            'state': self.state,
+            'address': self.address,
+            'phone': self.phone,
+            'image_link': self.image_link,
+            'facebook_link': self.facebook_link,
+            'genres': self.genres,
+            'website': self.website,
+            'seeking_talent': self.seeking_talent,
+            'seeking_description': self.seeking_description
+        }
+
+
+class Artist(db.Model):
+    __tablename__ = 'artist'
+    __table_args__ = (
+        db.Index('ix_artist_genres', 'genres', postgresql_using='gin'),
+        db.Index('ix_artist_city', 'city'),
+        db.Index(
+            'ix_artist_name_trgm', 'name', postgresql_using='gin',
+            postgresql_ops={'name': 'gin_trgm_ops'}),
+        db.Index(
+            'ix_artist_search_document',
+            db.text('fyyur_search_document(name, city, state, genres)'),
+            postgresql_using='gin'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String, unique=True)
+    city = db.Column(db.String(120))
+    state = db.Column(db.String(120))
+    phone = db.Column(db.String(120))
+    # vocabulary names only, see forms.normalize_genres
+    genres = db.Column(ARRAY(db.String))
+    image_link = db.Column(db.String(500))
+    facebook_link = db.Column(db.String(120))
+    #added - DONE
+    website = db.Column(db.String(120))
+    seeking_venue = db.Column(db.Boolean)
+    seeking_description = db.Column(db.String(500))
+    # bumped by every edit, see update_from_form in app.py
+    version = db.Column(
+        db.Integer, nullable=False, default=1, server_default='1')
+    updated_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+        index=True,
+        server_default=db.text("timezone('utc', now())"))
+    # loading strategy ('select', 'selectin', 'joined', ...) is configurable
+    show = db.relationship(
+        'Show',
+        back_populates="artist",
+        lazy=config.ARTIST_SHOWS_LOADING)
+
+    # TODO: implement any missing fields, as a database migration using
+    # Flask-Migrate - DONE
+    def artist_to_dictionary(self):
+        return{
+            'id': self.id,
+            'name': self.name,
+            'city': self.city,
+            'state': self.state,
+            'phone': self.phone,
+            'genres': self.genres,
+            'image_link': self.image_link,
+            'facebook_link': self.facebook_link,
+            'website': self.website,
+            'seeking_venue': self.seeking_venue,
+            'seeking_description': self.seeking_description
+        }
+
+# TODO Implement Show and Artist models, and complete all model
+# relationships and properties, as a database migration. - DONE
+
+
+# the span a show occupies. The exclusion constraints below (and their GiST
+# indexes) are built on exactly this expression; Show.end_time compiles to
+# it, so db.func.tsrange(Show.start_time, Show.end_time) can use them
+SHOW_DURING = "tsrange(start_time, start_time + duration * interval '1 minute')"
+
+
+class Show(db.Model):
+    __tablename__ = 'show'
+
+    __table_args__ = (
+        # no two overlapping shows at a venue or for an artist (a NULL
+        # start_time would make an unbounded range). The '=' on an integer
+        # column needs btree_gist, see 727cf7392bd7
+        ExcludeConstraint(
+            (db.column('venue_id'), '='), (db.text(SHOW_DURING), '&&'),
+            name='show_venue_id_during_excl', using='gist',
+            where=db.text('start_time IS NOT NULL')),
+        ExcludeConstraint(
+            (db.column('artist_id'), '='), (db.text(SHOW_DURING), '&&'),
+            name='show_artist_id_during_excl', using='gist',
+            where=db.text('start_time IS NOT NULL')),
+        # past/upcoming lookups per venue and per artist, see f02f77987287
+        db.Index(
+            'ix_show_venue_id_start_time', 'venue_id', 'start_time',
+            postgresql_include=['id', 'artist_id']),
+        db.Index(
+            'ix_show_artist_id_start_time', 'artist_id', 'start_time',
+            postgresql_include=['id', 'venue_id']),
+        db.Index('ix_show_start_time_id', 'start_time', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    start_time = db.Column(db.DateTime)
+    # minutes
+    duration = db.Column(
+        db.Integer, nullable=False, default=120, server_default='120')
+    end_time = db.column_property(
+        start_time + duration * db.literal_column(
+            "interval '1 minute'", db.Interval))
+    # table linked to venue via db.relationship
+    venue_id = db.Column(
+        db.Integer,
+        db.ForeignKey('venue.id'),
+        nullable=False)
+    # table linked to artist via db.relationship
+    artist_id = db.Column(
+        db.Integer,
+        db.ForeignKey('artist.id'),
+        nullable=False)
+    updated_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=datetime.utcnow,
+        onupdate=datetime.utcnow,
+        index=True,
+        server_default=db.text("timezone('utc', now())"))
+    venue = db.relationship("Venue", back_populates="show")
+    artist = db.relationship("Artist", back_populates="show")
+
+    @classmethod
+    def during(cls):
+        return db.func.tsrange(cls.start_time, cls.end_time)
+
+    def show_artist(self):
+        return {
+            'artist_id': self.artist_id,
+            'artist_name': self.artist.name,
+            'artist_image_link': self.artist.image_link,
+            'start_time': self.start_time
+        }
+
+    def show_venue(self):
+        return {
+            'venue_id': self.venue_id,
+            'venue_name': self.venue.name,
+            'venue_image_link': self.venue.image_link,
+            'start_time': self.start_time
+        }
+
+
+# db.create_all() (the benchmarks use it) needs the extension as well
+db.event.listen(
+    Show.__table__, 'before_create',
+    db.DDL('CREATE EXTENSION IF NOT EXISTS btree_gist'))
+# and the name_trgm and search_document indexes on venue and artist need
+# pg_trgm and fyyur_search_document (array_to_string is only STABLE, so the
+# document is wrapped in an IMMUTABLE function that can back an index), see
+# c08b78d76e67. Before any table, as either one may be created first
+db.event.listen(
+    db.metadata, 'before_create',
+    db.DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm'))
+db.event.listen(
+    db.metadata, 'before_create',
+    db.DDL("""
+        CREATE OR REPLACE FUNCTION fyyur_search_document(
+            name text, city text, state text, genres text[])
+        RETURNS tsvector AS $$
+            SELECT to_tsvector('simple',
+                coalesce(name, '') || ' ' ||
+                coalesce(city, '') || ' ' ||
+                coalesce(state, '') || ' ' ||
+                coalesce(array_to_string(genres, ' '), ''))
+        $$ LANGUAGE sql IMMUTABLE
+    """))
+
+
+class VenueStats(db.Model):
+    # show counts per venue, materialized for /venues. Kept
+    # current by stats.refresh_show_stats as shows are added or removed;
+    # as time passes upcoming shows become past ones, so a scheduled
+    # 'flask fyyur refresh-stats' moves them over
+    __tablename__ = 'venue_stats'
+
+    venue_id = db.Column(
+        db.Integer,
+        db.ForeignKey('venue.id', ondelete='CASCADE'),
+        primary_key=True)
+    upcoming_shows_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default='0')
+    next_show_time = db.Column(db.DateTime)
+    # when the counts were computed, in UTC like updated_at (the counts
+    # themselves split shows at local time, like start_time)
+    refreshed_at = db.Column(db.DateTime, nullable=False, index=True)
+
@@ -0,0 +1,220 @@
+import heapq
+import math
+import threading
+import time
+
+from sqlalchemy import select
+
+from models import db, Venue
+
+EARTH_RADIUS_KM = 6371.0088
+
+
+#----------------------------------------------------------------------------#
+# Geometry.
+#----------------------------------------------------------------------------#
+
+def to_point(latitude, longitude):
+    # the position on the unit sphere: straight-line (chord) distance
+    # between points orders them like great-circle distance does, without
+    # any wrap-around at the antimeridian
+    latitude, longitude = math.radians(latitude), math.radians(longitude)
+    return (math.cos(latitude) * math.cos(longitude),
+            math.cos(latitude) * math.sin(longitude),
+            math.sin(latitude))
+
+
+def chord_to_km(chord):
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+
+def km_to_chord(km):
+    return 2 * math.sin(min(math.pi, km / EARTH_RADIUS_KM) / 2)
+
+
+#----------------------------------------------------------------------------#
+# k-d tree.
+#----------------------------------------------------------------------------#
+
+class KDTree(object):
+    # a static 3-d tree over (x, y, z, id) points, split on the axis with
+    # the widest spread, with buckets of up to LEAF_SIZE points
+
+    LEAF_SIZE = 16
+
+    def __init__(self, points):
+        self.size = len(points)
+        self.root = self._build(list(points))
+
+    def _build(self, points):
+        if len(points) <= self.LEAF_SIZE:
+            return (None, points)
+        spreads = [
+            max(point[axis] for point in points) -
+            min(point[axis] for point in points)
+            for axis in range(3)
+        ]
+        axis = spreads.index(max(spreads))
+        points.sort(key=lambda point: point[axis])
+        middle = len(points) // 2
+        return (axis, points[middle][axis],
+                self._build(points[:middle]), self._build(points[middle:]))
+
+    def nearest(self, target, limit, max_chord, skip=()):
+        # up to limit (squared chord, id) within max_chord of target,
+        # closest first, leaving out ids in skip. Branches further than the
+        # current limit-th match are pruned
+        found = []
+        bound = [max_chord * max_chord]
+        self._search(self.root, target, limit, bound, found, skip)
+        return sorted((-distance, row_id) for distance, row_id in found)
+
+    def _search(self, node, target, limit, bound, found, skip):
+        axis = node[0]
+        if axis is None:
+            tx, ty, tz = target
+            for x, y, z, row_id in node[1]:
+                distance = (x - tx) ** 2 + (y - ty) ** 2 + (z - tz) ** 2
+                if distance > bound[0] or row_id in skip:
+                    continue
+                if len(found) < limit:
+                    heapq.heappush(found, (-distance, row_id))
+                else:
+                    heapq.heapreplace(found, (-distance, row_id))
+                if len(found) == limit:
+                    bound[0] = -found[0][0]
+            return
+        _, split, left, right = node
+        offset = target[axis] - split
+        near, far = (left, right) if offset < 0 else (right, left)
+        self._search(near, target, limit, bound, found, skip)
+        if offset * offset <= bound[0]:
+            self._search(far, target, limit, bound, found, skip)
+
+
+#----------------------------------------------------------------------------#
+# Venue locations.
+#----------------------------------------------------------------------------#
+
+class VenueLocations(object):
+    # the spatial index behind /venues/nearby: a k-d tree of geocoded
+    # venues, one per worker process. Built on the first lookup, then the
+    # create, edit and delete views record their changes on the side
+    # (checked by brute force) until the next rebuild, in the background
+    # every NEARBY_REFRESH_SECONDS or once NEARBY_MAX_PENDING changes pile
+    # up; the rebuild also picks up other workers' and the CLI's changes
+
+    def __init__(self, app=None):
+        self.tree = None
+        self.built = 0
+        # id -> point added or moved since the build, and ids whose tree
+        # point is out of date
+        self.pending = {}
+        self.stale = set()
+        # id -> point (None: removed) of the changes made while a build
+        # reads its snapshot, None when no build is running
+        self.edits = None
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._rebuilding = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.refresh = app.config.get('NEARBY_REFRESH_SECONDS', 300)
+        self.max_pending = app.config.get('NEARBY_MAX_PENDING', 1000)
+        app.extensions['venue_locations'] = self
+
+    def build(self):
+        # straight off the primary, outside any session. The snapshot may
+        # or may not include changes committed while it is read, so those
+        # stay on the side of the new tree until the next build
+        with self._lock:
+            self.edits = {}
+        try:
+            with db.engine.connect() as connection:
+                points = [
+                    to_point(latitude, longitude) + (row_id,)
+                    for row_id, latitude, longitude in connection.execute(
+                        select(
+                            Venue.id, Venue.latitude, Venue.longitude
+                        ).where(
+                            Venue.latitude.isnot(None),
+                            Venue.longitude.isnot(None)))
+                ]
+            tree = KDTree(points)
+        except BaseException:
+            with self._lock:
+                self.edits = None
+            raise
+        with self._lock:
+            self.tree = tree
+            self.pending = {
+                row_id: point for row_id, point in self.edits.items()
+                if point is not None}
+            self.stale = set(self.edits)
+            self.edits = None
+            self.built = time.monotonic()
+
+    def rebuild(self):
+        try:
+            with self.app.app_context():
+                self.build()
+        finally:
+            self._rebuilding = False
+
+    def current(self):
+        if self.tree is None:
+            with self._build_lock:
+                if self.tree is None:
+                    self.build()
+        elif (time.monotonic() - self.built > self.refresh or
+                len(self.stale) > self.max_pending) and not self._rebuilding:
+            with self._build_lock:
+                if not self._rebuilding:
+                    self._rebuilding = True
+                    threading.Thread(target=self.rebuild, daemon=True).start()
+        return self.tree
+
+    def nearest(self, latitude, longitude, radius_km, limit):
+        # [(distance in km, venue id)] within radius_km, closest first
+        tree = self.current()
+        target = to_point(latitude, longitude)
+        max_chord = km_to_chord(radius_km)
+        with self._lock:
+            pending = list(self.pending.items())
+            stale = frozenset(self.stale)
+        found = tree.nearest(target, limit, max_chord, skip=stale)
+        for row_id, point in pending:
+            distance = sum((a - b) ** 2 for a, b in zip(point, target))
+            if distance <= max_chord * max_chord:
+                found.append((distance, row_id))
+        return [
+            (chord_to_km(math.sqrt(distance)), row_id)
+            for distance, row_id in sorted(found)[:limit]
+        ]
+
+    # called by the write views once their commit succeeded; until the
+    # first lookup there is no index to update
+
+    def move(self, row_id, latitude, longitude):
+        point = None
+        if latitude is not None and longitude is not None:
+            point = to_point(latitude, longitude)
+        with self._lock:
+            if self.edits is not None:
+                self.edits[row_id] = point
+            if self.tree is None:
+                return
+            self.stale.add(row_id)
+            if point is None:
+                self.pending.pop(row_id, None)
+            else:
+                self.pending[row_id] = point
+
+    def remove(self, row_id):
+        self.move(row_id, None, None)
+
+
+venue_locations = VenueLocations()
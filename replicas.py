@@ -0,0 +1,116 @@
+import itertools
+import threading
+from collections import Counter
+
+from flask import g, has_request_context, request
+from flask_sqlalchemy import SignallingSession, SQLAlchemy
+from sqlalchemy import event, orm
+
+READ_METHODS = ('GET', 'HEAD')
+PRIMARY_COOKIE = 'fyyur_read_primary'
+
+
+#----------------------------------------------------------------------------#
+# Session.
+#----------------------------------------------------------------------------#
+
+class RoutingSession(SignallingSession):
+    # sends a read request's queries to the replica ReplicaRouter picked
+    # for it; everything else, and any flush, goes to the primary
+
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        router = self.app.extensions.get('replicas')
+        if router is not None and not self._flushing and \
+                router.reads_from_replica():
+            return router.engine()
+        return super().get_bind(mapper, clause)
+
+
+class RoutingSQLAlchemy(SQLAlchemy):
+
+    def create_session(self, options):
+        return orm.sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def remember_commit(session):
+    # background jobs and CLI commands commit outside any request
+    if has_request_context():
+        g.db_committed = True
+
+
+#----------------------------------------------------------------------------#
+# Router.
+#----------------------------------------------------------------------------#
+
+class ReplicaRouter(object):
+    # GET and HEAD requests read from one of the SQLALCHEMY_BINDS named
+    # replica_*, chosen per request by DB_REPLICA_SELECTION: 'round_robin'
+    # or 'least_connections' (fewest requests of this process on it). A
+    # request that commits sets a cookie that keeps its browser on the
+    # primary for DB_READ_YOUR_WRITES_SECONDS, so the redirect after a form
+    # does not read from a replica that is behind
+
+    def __init__(self, app=None):
+        self.binds = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.binds = sorted(
+            key for key in app.config.get('SQLALCHEMY_BINDS') or {}
+            if key.startswith('replica_'))
+        self.selection = app.config.get('DB_REPLICA_SELECTION', 'round_robin')
+        self.window = app.config.get('DB_READ_YOUR_WRITES_SECONDS', 10)
+        self.primary_endpoints = frozenset(
+            app.config.get('DB_PRIMARY_ENDPOINTS', ()))
+        self.active = Counter()
+        self._turn = itertools.count()
+        self._lock = threading.Lock()
+        app.after_request(self.pin_after_write)
+        app.teardown_request(self.release)
+        app.extensions['replicas'] = self
+
+    def reads_from_replica(self):
+        return bool(self.binds) and has_request_context() and \
+            request.method in READ_METHODS and \
+            request.endpoint not in self.primary_endpoints and \
+            not self.pinned()
+
+    def pinned(self):
+        # this browser wrote within the last DB_READ_YOUR_WRITES_SECONDS
+        return bool(self.binds) and has_request_context() and \
+            PRIMARY_COOKIE in request.cookies
+
+    def engine(self):
+        # one replica per request, so all its queries see the same state
+        if 'replica' not in g:
+            g.replica = self.pick()
+        db = self.app.extensions['sqlalchemy'].db
+        return db.get_engine(self.app, bind=g.replica)
+
+    def pick(self):
+        with self._lock:
+            if self.selection == 'least_connections':
+                bind = min(self.binds, key=lambda key: self.active[key])
+            else:
+                bind = self.binds[next(self._turn) % len(self.binds)]
+            self.active[bind] += 1
+        return bind
+
+    def release(self, exception=None):
+        bind = g.pop('replica', None)
+        if bind is not None:
+            with self._lock:
+                self.active[bind] -= 1
+
+    def pin_after_write(self, response):
+        if g.pop('db_committed', False) and self.binds:
+            response.set_cookie(
+                PRIMARY_COOKIE, '1', max_age=self.window, httponly=True,
+                samesite='Lax')
+        return response
+
+
+replicas = ReplicaRouter()
@@ -2,3 +2,37 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+// search-as-you-type: fill the search box's datalist from /suggest
+document.addEventListener('DOMContentLoaded', function () {
+  var inputs = document.querySelectorAll('input[data-suggest]');
+  Array.prototype.forEach.call(inputs, function (input) {
+    var list = document.getElementById(input.getAttribute('list'));
+    var kind = input.getAttribute('data-suggest');
+    var pending = null;
+    input.addEventListener('input', function () {
+      var q = input.value;
+      if (pending) {
+        pending.abort();
+      }
+      if (!q) {
+        list.innerHTML = '';
+        return;
+      }
+      pending = new XMLHttpRequest();
+      pending.open('GET', '/suggest?q=' + encodeURIComponent(q));
+      pending.onload = function () {
+        if (this.status !== 200) {
+          return;
+        }
+        list.innerHTML = '';
+        JSON.parse(this.responseText)[kind].forEach(function (match) {
+          var option = document.createElement('option');
+          option.value = match.name;
+          list.appendChild(option);
+        });
+      };
+      pending.send();
+    });
+  });
+});
@@ -0,0 +1,45 @@
+#----------------------------------------------------------------------------#
+# Imports
+#----------------------------------------------------------------------------#
+
+from datetime import datetime
+
+from sqlalchemy.dialects.postgresql import insert
+
+from models import db, Venue, Show, VenueStats
+
+#----------------------------------------------------------------------------#
+# Show statistics.
+#----------------------------------------------------------------------------#
+
+
+def refresh_show_stats(venue_ids=None, now=None):
+    # one INSERT ... SELECT ... ON CONFLICT DO UPDATE recomputing the stats
+    # of the given venues (every venue when venue_ids is None) from show.
+    # Per venue this is a range scan of the (venue_id, start_time) index.
+    # Runs in the caller's transaction. now is local time like start_time;
+    # refreshed_at is UTC like updated_at, as the /venues validators
+    # compare the two
+    now = now or datetime.now()
+    refreshed_at = datetime.utcnow()
+    upcoming = Show.start_time >= now
+    query = db.session.query(
+        Venue.id,
+        db.func.count(Show.id).filter(upcoming),
+        db.func.count(Show.id).filter(Show.start_time < now),
+        db.func.min(Show.start_time).filter(upcoming),
+        db.literal(refreshed_at)
+    ).outerjoin(Show, Show.venue_id == Venue.id).group_by(Venue.id)
+    if venue_ids is not None:
+        query = query.filter(Venue.id.in_(venue_ids))
+
+    columns = [VenueStats.venue_id, VenueStats.upcoming_shows_count,
+               VenueStats.past_shows_count, VenueStats.next_show_time,
+               VenueStats.refreshed_at]
+    statement = insert(VenueStats.__table__).from_select(
+        [column.name for column in columns], query.statement)
+    statement = statement.on_conflict_do_update(
+        index_elements=[VenueStats.venue_id.name],
+        set_={column.name: statement.excluded[column.name]
+              for column in columns[1:]})
+    db.session.execute(statement)
@@ -0,0 +1,206 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+
+from sqlalchemy import select
+
+from models import db, Venue, Artist
+
+
+#----------------------------------------------------------------------------#
+# Prefix index.
+#----------------------------------------------------------------------------#
+
+def normalize(name):
+    return ' '.join(name.casefold().split())
+
+
+def index_keys(name):
+    # a name is found by its start, and also past a leading "the", so
+    # "jazz" finds "The Jazz Room"
+    key = normalize(name)
+    if key.startswith('the ') and len(key) > 4:
+        return (key, key[4:])
+    return (key,)
+
+
+class PrefixIndex(object):
+    # names sorted by normalized key in parallel arrays: a lookup is a
+    # bisect and a short scan, so it stays in microseconds at millions of
+    # names. Adding or removing a name shifts the arrays, which is fine
+    # for one row per request
+
+    def __init__(self, rows=()):
+        entries = sorted(
+            (key, row_id, name)
+            for row_id, name in rows if name
+            for key in index_keys(name))
+        self.keys = [key for key, _, _ in entries]
+        self.ids = array('q', (row_id for _, row_id, _ in entries))
+        self.names = [name for _, _, name in entries]
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.keys)
+
+    def lookup(self, prefix, limit):
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        matches = []
+        seen = set()
+        with self._lock:
+            index = bisect_left(self.keys, prefix)
+            while index < len(self.keys) and len(matches) < limit and \
+                    self.keys[index].startswith(prefix):
+                row_id = self.ids[index]
+                if row_id not in seen:
+                    seen.add(row_id)
+                    matches.append({'id': row_id, 'name': self.names[index]})
+                index += 1
+        return matches
+
+    def add(self, row_id, name):
+        with self._lock:
+            self._add(row_id, name)
+
+    def remove(self, row_id):
+        with self._lock:
+            self._remove(row_id)
+
+    def replace(self, row_id, name):
+        with self._lock:
+            self._remove(row_id)
+            self._add(row_id, name)
+
+    def _add(self, row_id, name):
+        for key in index_keys(name or ''):
+            index = bisect_right(self.keys, key)
+            self.keys.insert(index, key)
+            self.ids.insert(index, row_id)
+            self.names.insert(index, name)
+
+    def _remove(self, row_id):
+        # one bytes.find pass over the raw id array, several times faster
+        # than array.index, which boxes every element
+        raw = self.ids.tobytes()
+        needle = array('q', (row_id,)).tobytes()
+        size = self.ids.itemsize
+        found = []
+        offset = raw.find(needle)
+        while offset != -1:
+            if offset % size:
+                offset = raw.find(needle, offset + 1)
+                continue
+            found.append(offset // size)
+            offset = raw.find(needle, offset + size)
+        for index in reversed(found):
+            del self.keys[index]
+            del self.ids[index]
+            del self.names[index]
+
+
+#----------------------------------------------------------------------------#
+# Suggestions.
+#----------------------------------------------------------------------------#
+
+class Suggestions(object):
+    # venue and artist names for /suggest, one index per worker process.
+    # Built on the first lookup (create_app does no database I/O) and kept
+    # current by the create, edit and delete views; rebuilt in the
+    # background every SUGGEST_REFRESH_SECONDS to pick up changes made by
+    # other workers and the CLI
+
+    MODELS = {'venues': Venue, 'artists': Artist}
+
+    def __init__(self, app=None):
+        self.indexes = None
+        self.built = 0
+        # (method, kind, args) of the edits made while a build reads its
+        # snapshot, None when no build is running
+        self.edits = None
+        self._lock = threading.Lock()
+        self._edit_lock = threading.Lock()
+        self._rebuilding = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.limit = app.config.get('SUGGEST_LIMIT', 10)
+        self.refresh = app.config.get('SUGGEST_REFRESH_SECONDS', 300)
+        app.extensions['suggestions'] = self
+
+    def build(self):
+        # straight off the primary, outside any session. The snapshot may
+        # miss edits committed while it is read, so those are recorded and
+        # replayed onto the new indexes before they are swapped in
+        with self._edit_lock:
+            self.edits = []
+        try:
+            indexes = {}
+            with db.engine.connect() as connection:
+                for kind, model in self.MODELS.items():
+                    indexes[kind] = PrefixIndex(
+                        connection.execute(select(model.id, model.name)))
+        except BaseException:
+            with self._edit_lock:
+                self.edits = None
+            raise
+        with self._edit_lock:
+            for method, kind, args in self.edits:
+                getattr(indexes[kind], method)(*args)
+            self.edits = None
+            self.indexes = indexes
+            self.built = time.monotonic()
+
+    def rebuild(self):
+        try:
+            with self.app.app_context():
+                self.build()
+        finally:
+            self._rebuilding = False
+
+    def current(self):
+        if self.indexes is None:
+            with self._lock:
+                if self.indexes is None:
+                    self.build()
+        elif time.monotonic() - self.built > self.refresh and \
+                not self._rebuilding:
+            with self._lock:
+                if not self._rebuilding:
+                    self._rebuilding = True
+                    threading.Thread(target=self.rebuild, daemon=True).start()
+        return self.indexes
+
+    def lookup(self, prefix, limit=None):
+        limit = min(limit or self.limit, self.limit)
+        return {
+            kind: index.lookup(prefix, limit)
+            for kind, index in self.current().items()
+        }
+
+    # called by the write views once their commit succeeded; until the
+    # first lookup there is no index to update. A new row may already be
+    # in a snapshot read after its commit, so adding replaces
+
+    def add(self, kind, row_id, name):
+        self.edit('replace', kind, row_id, name)
+
+    def replace(self, kind, row_id, name):
+        self.edit('replace', kind, row_id, name)
+
+    def remove(self, kind, row_id):
+        self.edit('remove', kind, row_id)
+
+    def edit(self, method, kind, *args):
+        with self._edit_lock:
+            if self.edits is not None:
+                self.edits.append((method, kind, args))
+            if self.indexes is not None:
+                getattr(self.indexes[kind], method)(*args)
+
+
+suggestions = Suggestions()
@@ -0,0 +1,32 @@
+"""/api/v1/shows leaves out shows without a start time.
+
+They sort after every dated show, so a page ending on one would hand out
+a [null, id] cursor that the next request rejects. The full listing is
+streamed as ndjson, which reaches past the last dated show.
+"""
+import json
+from datetime import datetime
+
+from models import db, Venue, Artist, Show
+
+
+def test_shows_without_start_time_are_not_listed(app, client, dataset):
+    with app.app_context():
+        venue = Venue(name='Undated show venue')
+        artist = Artist(name='Undated show artist')
+        db.session.add_all([venue, artist])
+        db.session.flush()
+        db.session.add_all([
+            Show(venue_id=venue.id, artist_id=artist.id,
+                 start_time=datetime(2999, 1, 1, 20, 0)),
+            Show(venue_id=venue.id, artist_id=artist.id, start_time=None),
+        ])
+        db.session.commit()
+        dated = Show.query.filter(Show.start_time.isnot(None)).count()
+        db.session.remove()
+
+    response = client.get('/api/v1/shows?format=ndjson&fields=id,start_time')
+    assert response.status_code == 200
+    shows = [json.loads(line) for line in response.get_data().splitlines()]
+    assert len(shows) == dated
+    assert all(show['start_time'] is not None for show in shows)
@@ -0,0 +1,77 @@
+"""Simultaneous conflicting bookings end with exactly one show.
+
+CONCURRENCY overlapping POST /shows/create requests are fired at once,
+one thread each: all at the same venue with different artists, then all
+for the same artist at different venues. The exclusion constraints must
+turn away every one but the first to commit.
+"""
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db, Venue, Artist, Show
+
+CONCURRENCY = 20
+START = datetime(2030, 1, 1, 20, 0)
+
+
+def race(app, bookings):
+    # every thread waits at the barrier, so the INSERTs hit the database
+    # together and all but one must lose on the exclusion constraint
+    barrier = threading.Barrier(len(bookings))
+
+    def book(form):
+        client = app.test_client()
+        barrier.wait()
+        client.post('/shows/create', data=form)
+
+    threads = [threading.Thread(target=book, args=(form,))
+               for form in bookings]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def booking(venue_id, artist_id, i):
+    # start times staggered by a minute: all two-hour shows still overlap
+    return {
+        'venue_id': venue_id,
+        'artist_id': artist_id,
+        'start_time': (START + timedelta(minutes=i)).strftime(
+            '%Y-%m-%d %H:%M:%S'),
+        'duration': 120,
+    }
+
+
+def add_rows(app, model, prefix, count):
+    # new rows of their own, so no seeded show is in the way
+    with app.app_context():
+        rows = [model(name='{} {}'.format(prefix, i)) for i in range(count)]
+        db.session.add_all(rows)
+        db.session.commit()
+        ids = [row.id for row in rows]
+        db.session.remove()
+    return ids
+
+
+@pytest.mark.parametrize('shared', ['venue', 'artist'])
+def test_one_of_simultaneous_bookings_wins(app, dataset, shared):
+    prefix = 'Race for one {}'.format(shared)
+    venue_ids = add_rows(app, Venue, prefix + ' venue', CONCURRENCY)
+    artist_ids = add_rows(app, Artist, prefix + ' artist', CONCURRENCY)
+    if shared == 'venue':
+        condition = Show.venue_id == venue_ids[0]
+        bookings = [booking(venue_ids[0], artist_id, i)
+                    for i, artist_id in enumerate(artist_ids)]
+    else:
+        condition = Show.artist_id == artist_ids[0]
+        bookings = [booking(venue_id, artist_ids[0], i)
+                    for i, venue_id in enumerate(venue_ids)]
+
+    race(app, bookings)
+
+    with app.app_context():
+        assert db.session.query(Show).filter(condition).count() == 1
+        db.session.remove()
@@ -0,0 +1,41 @@
+"""The app starts in production mode unless the environment says otherwise.
+
+config.py is re-read under a patched environment and loaded into a bare
+Flask app, as create_app() loads it; no database is needed.
+"""
+import importlib
+
+import pytest
+from flask import Flask
+
+import config
+
+
+@pytest.fixture
+def environ(monkeypatch):
+    monkeypatch.delenv('FLASK_DEBUG', raising=False)
+    monkeypatch.delenv('TEMPLATES_AUTO_RELOAD', raising=False)
+    yield monkeypatch
+    monkeypatch.undo()
+    importlib.reload(config)
+
+
+def configured_app():
+    importlib.reload(config)
+    app = Flask(__name__)
+    app.config.from_object(config)
+    return app
+
+
+def test_production_by_default(environ):
+    app = configured_app()
+    assert not app.debug
+    assert not app.config['TEMPLATES_AUTO_RELOAD']
+    assert not app.jinja_env.auto_reload
+
+
+def test_debug_from_environment(environ):
+    environ.setenv('FLASK_DEBUG', '1')
+    app = configured_app()
+    assert app.debug
+    assert app.jinja_env.auto_reload
@@ -0,0 +1,51 @@
+"""flask fyyur import reports bad records instead of failing mid-import.
+
+A show naming a venue that does not exist is rejected with its record
+number and a non-zero exit status, while the rest of its batch loads.
+Imported venues are geocoded like those created through the form.
+"""
+import json
+
+from models import db, Venue, Artist, Show
+
+
+def run_import(app, entity, records):
+    source = ''.join(json.dumps(record) + '\n' for record in records)
+    return app.test_cli_runner().invoke(
+        args=['fyyur', 'import', entity], input=source)
+
+
+def test_unknown_venue_is_reported(app, dataset):
+    with app.app_context():
+        venue = Venue(name='Import target venue')
+        artist = Artist(name='Import target artist')
+        db.session.add_all([venue, artist])
+        db.session.commit()
+        venue_id, artist_id = venue.id, artist.id
+        db.session.remove()
+
+    show = {'venue_id': venue_id, 'artist_id': artist_id,
+            'start_time': '2998-01-01 20:00:00', 'duration': 60}
+    # a day apart, so the second is not skipped for overlapping the first
+    result = run_import(app, 'shows', [
+        show, dict(show, venue_id=0, start_time='2998-01-02 20:00:00')])
+
+    assert result.exit_code == 1
+    assert not isinstance(result.exception, Exception)
+    assert 'record 2: unknown venue_id 0' in result.output
+    with app.app_context():
+        assert Show.query.filter(Show.venue_id == venue_id).count() == 1
+        db.session.remove()
+
+
+def test_imported_venues_are_geocoded(app, dataset):
+    result = run_import(app, 'venues', [{
+        'name': 'Imported venue', 'city': 'Chicago', 'state': 'IL',
+        'address': '1 Main St', 'genres': ['Jazz'],
+        'facebook_link': 'https://www.facebook.com/imported'}])
+
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        venue = Venue.query.filter(Venue.name == 'Imported venue').one()
+        assert venue.latitude is not None
+        db.session.remove()
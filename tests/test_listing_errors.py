@@ -0,0 +1,11 @@
+"""A bad request to a listing is answered as one, not as an empty page.
+
+An unknown ?after= cursor is a 400, and carries no ETag a browser could
+revalidate against later.
+"""
+
+
+def test_unknown_after_is_a_bad_request(client):
+    response = client.get('/venues?genre=Jazz&after=0')
+    assert response.status_code == 400
+    assert 'ETag' not in response.headers
@@ -0,0 +1,44 @@
+"""A cached page is not served once its validators have moved.
+
+Each worker has its own memory cache, so an edit made on another worker
+invalidates nothing here. The cached body must still give way to a fresh
+render as soon as the ETag changes.
+"""
+import pytest
+
+from app import db, page_cache
+from models import Venue
+
+
+@pytest.fixture
+def memory_cache(app):
+    app.config['CACHE_BACKEND'] = 'memory'
+    page_cache.init_app(app)
+    yield page_cache
+    app.config['CACHE_BACKEND'] = None
+    page_cache.init_app(app)
+
+
+def test_edit_without_invalidation_is_not_served_stale(
+        app, client, memory_cache):
+    with app.app_context():
+        venue = Venue(name='Cached before the edit', genres=['Jazz'])
+        db.session.add(venue)
+        db.session.commit()
+        venue_id = venue.id
+        db.session.remove()
+    path = '/venues/{}'.format(venue_id)
+
+    first = client.get(path)
+    assert client.get(path).get_data(as_text=True) == \
+        first.get_data(as_text=True)
+
+    # as another worker would: the row changes, this cache is not told
+    with app.app_context():
+        Venue.query.get(venue_id).name = 'Edited on another worker'
+        db.session.commit()
+        db.session.remove()
+
+    second = client.get(path)
+    assert 'Edited on another worker' in second.get_data(as_text=True)
+    assert second.headers['ETag'] != first.headers['ETag']
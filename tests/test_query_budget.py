@@ -0,0 +1,70 @@
+"""The routes in dataset.ROUTES stay within their budget of SQL statements.
+
+The page cache is disabled (see conftest.py), so the budgets include the
+ETag validator queries. A route over budget fails with the statements it
+repeated, usually a query inside a loop. Each response must also carry
+some of the seeded data, so an empty fallback page does not pass.
+"""
+import pytest
+from markupsafe import escape
+
+from dataset import ROUTES, request_for
+from models import db, Venue, Artist
+
+# text each response must contain, filled in from the busiest venue and
+# artist; JSON is compact, as the API and jsonify send it
+CONTENT = {
+    ('GET', '/'): 'Where musical artists meet musical venues',
+    ('GET', '/venues'): '{venue_name}',
+    ('GET', '/artists'): '{artist_name}',
+    # the area heading is only there with venues under it
+    ('GET', '/venues?genre=Jazz&city=Chicago'): 'Chicago, IL',
+    ('GET', '/artists?genre=Jazz&city=Chicago'): '<a href="/artists/',
+    ('GET', '/shows'): '<a href="/venues/',
+    ('GET', '/venues/{venue_id}'): '{venue_name}',
+    ('GET', '/artists/{artist_id}'): '{artist_name}',
+    ('GET', '/venues/{venue_id}/edit'): '{venue_name}',
+    ('GET', '/artists/{artist_id}/edit'): '{artist_name}',
+    ('POST', '/venues/search'): ' Hall ',
+    ('POST', '/artists/search'): 'The Jazz ',
+    ('GET', '/suggest?q=the'): '"name":"The ',
+    ('GET', '/venues/nearby?lat=41.88&lng=-87.63'): '"city":"Chicago"',
+    ('GET', '/venues/create'): 'List a new venue',
+    ('GET', '/artists/create'): 'List a new artist',
+    ('GET', '/shows/create'): 'List a new show',
+    ('POST', '/shows/create'): 'Show was successfully listed!',
+    ('GET', '/api/v1/venues'): '"name":"The ',
+    ('GET', '/api/v1/artists'): '"name":"The ',
+    ('GET', '/api/v1/shows'): '"artist_name":"The ',
+    ('GET', '/api/v1/venues/{venue_id}'): '"name":"{venue_name}"',
+    ('GET', '/api/v1/artists/{artist_id}'): '"name":"{artist_name}"',
+    ('GET', '/api/v1/venues/{venue_id}/free-slots'): '"start":"',
+    # counted by the listing requests earlier in ROUTES
+    ('GET', '/cache/stats'): '"misses":',
+    ('GET', '/metrics'): 'fyyur_requests_total',
+}
+
+
+@pytest.fixture(scope='module')
+def names(app, dataset):
+    with app.app_context():
+        names = {
+            'venue_name': db.session.get(Venue, dataset['venue_id']).name,
+            'artist_name': db.session.get(Artist, dataset['artist_id']).name,
+        }
+        db.session.remove()
+    return names
+
+
+@pytest.mark.parametrize(
+    'route', ROUTES, ids=['{} {}'.format(*route[:2]) for route in ROUTES])
+def test_route_within_query_budget(counted_client, dataset, names, route):
+    method, path, data = request_for(route, dataset)
+    response = counted_client(method, path, route[3], data)
+    assert response.status_code < 400
+
+    values = names
+    if response.mimetype == 'text/html':
+        values = {name: escape(value) for name, value in names.items()}
+    assert CONTENT[route[:2]].format(**values) in \
+        response.get_data(as_text=True)
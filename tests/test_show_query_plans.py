@@ -0,0 +1,52 @@
+"""The show lookups behind /venues and the detail pages use the indexes.
+
+Every SELECT a page issues is captured and EXPLAINed against the seeded
+dataset; a plan with a Seq Scan on show fails the test.
+"""
+import json
+
+import pytest
+from sqlalchemy import event
+
+PAGES = ('/venues', '/venues/{venue_id}', '/artists/{artist_id}')
+
+
+def seq_scans(plan):
+    if plan.get('Node Type') == 'Seq Scan' and \
+            plan.get('Relation Name') == 'show':
+        yield plan
+    for child in plan.get('Plans', ()):
+        yield from seq_scans(child)
+
+
+def explain(engine, statement, parameters):
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute('EXPLAIN (FORMAT JSON) ' + statement, parameters)
+        plan = cursor.fetchone()[0]
+    finally:
+        connection.close()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']
+
+
+@pytest.mark.parametrize('page', PAGES)
+def test_no_seq_scan_on_show(client, engine, dataset, page):
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith('SELECT'):
+            statements.append((statement, parameters))
+
+    event.listen(engine, 'before_cursor_execute', capture)
+    try:
+        response = client.get(page.format(**dataset))
+    finally:
+        event.remove(engine, 'before_cursor_execute', capture)
+    assert response.status_code == 200
+
+    for statement, parameters in statements:
+        assert not any(seq_scans(explain(engine, statement, parameters))), \
+            statement